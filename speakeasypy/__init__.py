@@ -1,2 +1,6 @@
 from speakeasypy.src.speakeasy import Speakeasy
 from speakeasypy.src.chatroom import Chatroom
+from speakeasypy.src.async_speakeasy import AsyncSpeakeasy
+from speakeasypy.src.async_chatroom import AsyncChatroom
+from speakeasypy.src.poll_scheduler import PollScheduler
+from speakeasypy.src.records import ChatMessageRecord, ReactionRecord, ChatRoomStateRecord
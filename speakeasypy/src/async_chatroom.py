@@ -0,0 +1,57 @@
+import asyncio
+
+from concurrent.futures import Executor
+from functools import partial
+from typing import List, Optional
+from speakeasypy.src.chatroom import Chatroom
+from speakeasypy.src.records import ChatMessageRecord, ReactionRecord
+
+
+class AsyncChatroom:
+    def __init__(self, chatroom: Chatroom, executor: Optional[Executor] = None):
+        """AsyncChatroom - an asyncio counterpart of Chatroom with the same methods as coroutines.
+
+        Unknown attributes (room_id, my_alias, remaining_time, mark_as_processed, ...) are read from and written to
+        the wrapped Chatroom. The blocking API calls run on a shared executor, so a single event loop can serve many rooms
+        without a thread per room; posting only enqueues the message (see Chatroom.post_messages).
+
+        Args:
+            chatroom (Chatroom): The chatroom to wrap.
+            executor (Executor, optional): Executor for the blocking API calls. Defaults to the loop's default executor.
+        """
+        self._chatroom = chatroom
+        self._executor = executor
+
+    def __getattr__(self, name):
+        return getattr(self._chatroom, name)
+
+    def __setattr__(self, name, value):
+        # Flags set on the wrapper (e.g. room.initiated = True) belong to the wrapped Chatroom
+        if name in ('_chatroom', '_executor'):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._chatroom, name, value)
+
+    async def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(func, *args, **kwargs))
+
+    async def get_messages(self, only_partner=True, only_new=True) -> List[ChatMessageRecord]:
+        return await self._run(self._chatroom.get_messages, only_partner=only_partner, only_new=only_new)
+
+    async def get_reactions(self, only_new=True) -> List[ReactionRecord]:
+        return await self._run(self._chatroom.get_reactions, only_new=only_new)
+
+    async def post_messages(self, message, on_sent=None):
+        await self._run(self._chatroom.post_messages, message, on_sent=on_sent)
+
+    def __eq__(self, other):
+        if isinstance(other, (AsyncChatroom, Chatroom)):
+            return self.room_id == other.room_id
+        return False
+
+    def __str__(self):
+        return str(self._chatroom)
+
+    def __repr__(self):
+        return str(self)
@@ -0,0 +1,55 @@
+import asyncio
+
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Dict, List, Optional
+from speakeasypy.src.async_chatroom import AsyncChatroom
+from speakeasypy.src.speakeasy import Speakeasy
+
+
+class AsyncSpeakeasy:
+    def __init__(self,
+                 host: Optional[str] = None,
+                 username: Optional[str] = None,
+                 password: Optional[str] = None,
+                 max_workers: int = 8,
+                 speakeasy: Optional[Speakeasy] = None):
+        """AsyncSpeakeasy - an asyncio counterpart of Speakeasy with the same methods as coroutines.
+
+        The blocking API calls run on one thread pool of max_workers threads shared by all rooms.
+
+        Args:
+            host (str): The Speakeasy host, e.g. https://speakeasy.ifi.uzh.ch.
+            username (str): The bot's username.
+            password (str): The bot's password.
+            max_workers (int, optional): Number of threads for the blocking API calls. Defaults to 8.
+            speakeasy (Speakeasy, optional): An existing (possibly logged-in) client to wrap instead of creating one.
+        """
+        self.speakeasy = speakeasy or Speakeasy(host=host, username=username, password=password)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._rooms: Dict[str, AsyncChatroom] = {}  # map room_id to AsyncChatroom (cache)
+
+    @property
+    def session_token(self):
+        return self.speakeasy.session_token
+
+    async def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(func, *args, **kwargs))
+
+    async def login(self) -> str:
+        return await self._run(self.speakeasy.login)
+
+    async def logout(self):
+        await self._run(self.speakeasy.logout)
+
+    async def get_rooms(self, active=True) -> List[AsyncChatroom]:
+        rooms = await self._run(self.speakeasy.get_rooms, active=active)
+        # Forget the wrappers of rooms that expired (Speakeasy drops those rooms as well)
+        self._rooms = {room_id: room for room_id, room in self._rooms.items() if room.remaining_time > 0}
+        async_rooms = []
+        for room in rooms:
+            if room.room_id not in self._rooms:
+                self._rooms[room.room_id] = AsyncChatroom(room, executor=self._executor)
+            async_rooms.append(self._rooms[room.room_id])
+        return async_rooms
@@ -1,9 +1,14 @@
 import logging
+import threading
 import time
 
+from collections import deque
 from datetime import datetime
-from typing import List, Union
+from multiprocessing.pool import ApplyResult
+from typing import Callable, List, Optional, Tuple, Union
 from speakeasypy.openapi.client.models import RestChatMessage, ChatMessageReaction
+from speakeasypy.src.rate_limiter import OUTBOX_FLUSHER, TokenBucket
+from speakeasypy.src.records import ChatMessageRecord, ChatRoomStateRecord, ReactionRecord, decode_room_state
 
 
 class Chatroom:
@@ -25,6 +30,14 @@ class Chatroom:
             start_time (int): The starting time of the chatroom.
             remaining_time (int): The remaining time for the chatroom's activity.
             user_aliases (List[str]): A list of user aliases participating in the chatroom (generally including a chat partner and your bot).
+            coalesce_window (float, optional): Seconds a queued message waits for follow-up messages that are then
+                sent with it in a single post, joined by newlines. Defaults to 0 (every message is posted on its own).
+            coalesce_max_chars (int, optional): Maximum length of a coalesced post. Defaults to 2000.
+            request_timeout (float or (float, float), optional): Timeout in seconds of this room's requests, or a
+                (connect, read) pair. Defaults to None (wait forever).
+            fast_deserialize (bool, optional): Decode room states straight from JSON instead of through the
+                type-checked generated models; either way the cache keeps compact records (see records.py).
+                Defaults to False.
         """
 
         self.room_id = room_id
@@ -44,102 +57,261 @@ class Chatroom:
                           f"api requests by this chatroom will result in an error")
         # Store ordinals for processed messages and reactions to exclude them from "new" messages.
         self.processed_ordinals = {
-            'messages': [],
-            'reactions': [],
+            'messages': set(),
+            'reactions': set(),
         }
 
         self.__request_limit = kwargs.get('request_limit', 1)  # seconds
-        self.__state_api_cache = None  # ChatRoomState (including messages and reactions from api call)
+        self.__state_api_cache = None  # ChatRoomStateRecord (compact copy of the messages and reactions from api calls)
         self.__last_msg_timestamp = 0
         self.__last_state_call = 0
-        self.__last_post_call = 0
+        self.__state_lock = threading.Lock()  # guards merging responses into the state cache
+        self.__message_ordinals = set()  # ordinals of the messages in the state cache
+        # Position in the cached messages before which every message is processed (or, for only_partner, our own),
+        # one cursor per value of only_partner, so that only_new scans start where the last scan stopped.
+        self.__new_message_cursor = {True: 0, False: 0}
+        # Outbound messages wait here until the post rate limit allows sending them
+        self.__outbox = deque()  # (enqueue time, message, on_sent callback or None)
+        self.__outbox_lock = threading.Lock()
+        self.__send_lock = threading.Lock()  # keeps messages in order when several threads flush
+        self.__post_bucket = TokenBucket(self.__request_limit)
+        self.__coalesce_window = kwargs.get('coalesce_window', 0)  # seconds
+        self.__coalesce_max_chars = kwargs.get('coalesce_max_chars', 2000)
+        self.__request_timeout = kwargs.get('request_timeout', None)
+        self.__fast_deserialize = kwargs.get('fast_deserialize', False)
+
+    @property
+    def request_limit(self) -> float:
+        """ Minimum number of seconds between two requests of the same kind by this room. """
+        return self.__request_limit
+
+    @property
+    def last_message_timestamp(self) -> int:
+        """ Timestamp (ms) of the newest message fetched so far, 0 before the first message. """
+        return self.__last_msg_timestamp
 
     def __update_chat_room_state(self):
         """ Cache the state of this room and implement a request rate limit for this API call. """
+        self.complete_state_update(self.begin_state_update(async_req=False))
+
+    def begin_state_update(self, async_req=True) -> Optional[tuple]:
+        """ Send the state request of this room (unless rate limited) without waiting for it.
+
+        Args:
+            async_req (bool, optional): Run the request on the ApiClient's thread pool. Defaults to True.
+
+        Returns:
+            The pending update to pass to complete_state_update, or None if no request was sent.
+        """
         if not self.session_token:
             logging.error(f"This room {self.room_id} has no active session. Updating room state failed.")
-            return
+            return None
         current_time = time.time()
         elapsed_time = current_time - self.__last_state_call
         if elapsed_time < self.__request_limit and self.__state_api_cache is not None:
-            return
+            return None
 
         try:
-            response = self.chat_api.get_api_room_with_roomid_with_since(
-                room_id=self.room_id, since=self.__last_msg_timestamp, session=self.session_token)
-            if response:
-                if self.__state_api_cache is None:
-                    self.__state_api_cache = response
-                else:
-                    # The reactions returned by the backend have nothing to do with the "since" parameter for now,
-                    # so just copy all reactions here.
-                    self.__state_api_cache.reactions = response.reactions
-                    # Append new messages and update the last timestamp
-                    for m in response.messages:
-                        if m.ordinal not in [msg.ordinal for msg in self.__state_api_cache.messages]:
-                            self.__state_api_cache.messages.append(m)
+            request = self.chat_api.get_api_room_with_roomid_with_since(
+                room_id=self.room_id, since=self.__last_msg_timestamp, session=self.session_token,
+                async_req=async_req, _request_timeout=self.__request_timeout,
+                # The fast path gets the raw HTTP response and decodes it itself
+                _preload_content=not self.__fast_deserialize)
+        except Exception as e:
+            logging.error(f"An error occurred while updating the state of room {self.room_id}: {e}")
+            return None
+        return current_time, request
+
+    def complete_state_update(self, pending: Optional[tuple]):
+        """ Wait for a state request sent by begin_state_update and merge its response into the cache. """
+        if pending is None:
+            return
+        current_time, request = pending
+        try:
+            response = request.get() if isinstance(request, ApplyResult) else request
+            if self.__fast_deserialize:
+                response = decode_room_state(response)
+            elif response:
+                # Only keep compact records, not the generated models with their per-instance dicts
+                response = ChatRoomStateRecord.from_model(response)
+            # Merges from different threads (e.g. refresh_all_rooms and a room worker) must not interleave,
+            # or a message could be appended (and answered) twice
+            with self.__state_lock:
+                if response:
+                    if self.__state_api_cache is None:
+                        self.__state_api_cache = response
+                        self.__message_ordinals = {m.ordinal for m in response.messages}
+                        # Start the next "since" query after the newest message we already have
+                        for m in response.messages:
                             self.__last_msg_timestamp = max(self.__last_msg_timestamp, m.time_stamp)
-            else:
-                logging.error(f"Failed to update the state of room {self.room_id}.")
-            self.__last_state_call = current_time
+                    else:
+                        # The reactions returned by the backend have nothing to do with the "since" parameter for now,
+                        # so just copy all reactions here.
+                        self.__state_api_cache.reactions = response.reactions
+                        # Append new messages and update the last timestamp
+                        for m in response.messages:
+                            if m.ordinal not in self.__message_ordinals:
+                                self.__message_ordinals.add(m.ordinal)
+                                self.__state_api_cache.messages.append(m)
+                                self.__last_msg_timestamp = max(self.__last_msg_timestamp, m.time_stamp)
+                else:
+                    logging.error(f"Failed to update the state of room {self.room_id}.")
+                self.__last_state_call = current_time
         except Exception as e:
             logging.error(f"An error occurred while updating the state of room {self.room_id}: {e}")
 
-    def get_messages(self, only_partner=True, only_new=True) -> List[RestChatMessage]:
+    def get_messages(self, only_partner=True, only_new=True) -> List[ChatMessageRecord]:
         self.__update_chat_room_state()
-        if self.__state_api_cache is None:
+        state = self.__state_api_cache  # read once: evict_state may reset the cache from another thread
+        if state is None:
             logging.error(f"Updating room state failed. No messages in room {self.room_id}.")
             return []
 
-        filtered_messages = self.__state_api_cache.messages
-
-        if only_partner:  # TODO: openAPI will automatically converts 'authorAlias' to 'author_alias'
-            filtered_messages = [message for message in filtered_messages if message.author_alias != self.my_alias]
+        filtered_messages = state.messages
 
         if only_new:
+            filtered_messages = filtered_messages[self.__advance_new_message_cursor(state, only_partner):]
             filtered_messages = [message for message in filtered_messages if
                                  message.ordinal not in self.processed_ordinals['messages']]
 
+        if only_partner:  # TODO: openAPI will automatically converts 'authorAlias' to 'author_alias'
+            filtered_messages = [message for message in filtered_messages if message.author_alias != self.my_alias]
+
         return filtered_messages
 
-    def get_reactions(self, only_new=True) -> List[ChatMessageReaction]:
+    def __advance_new_message_cursor(self, state, only_partner: bool) -> int:
+        """ Move the cursor past the leading processed (and, for only_partner, own) messages and return it. """
+        messages = state.messages
+        processed = self.processed_ordinals['messages']
+        with self.__state_lock:
+            # The cursor belongs to the current cache; start over for a cache reset by evict_state in the meantime
+            cursor = self.__new_message_cursor[only_partner] if self.__state_api_cache is state else 0
+        while cursor < len(messages) and (messages[cursor].ordinal in processed or
+                                          (only_partner and messages[cursor].author_alias == self.my_alias)):
+            cursor += 1
+        with self.__state_lock:
+            if self.__state_api_cache is state:
+                self.__new_message_cursor[only_partner] = cursor
+        return cursor
+
+    def get_reactions(self, only_new=True) -> List[ReactionRecord]:
         self.__update_chat_room_state()
-        if self.__state_api_cache is None:
+        state = self.__state_api_cache
+        if state is None:
             logging.error(f"Updating room state failed. No reactions in room {self.room_id}.")
             return []
 
-        filtered_reactions = self.__state_api_cache.reactions
+        filtered_reactions = state.reactions
         if only_new:
             filtered_reactions = [reaction for reaction in filtered_reactions if
                                   reaction.message_ordinal not in self.processed_ordinals['reactions']]
         return filtered_reactions
 
-    def post_messages(self, message):
-        if self.session_token:
-            # Check if the time elapsed since the last post call is less than the request limit.
-            current_time = time.time()
-            elapsed_time = current_time - self.__last_post_call
-            # If elapsed time is less than the request limit, sleep for the remaining time to enforce rate limiting.
-            if elapsed_time < self.__request_limit:
-                time.sleep(self.__request_limit - elapsed_time)
-                print(f"(Sleep {self.__request_limit - elapsed_time} secs to avoid posting requests too frequently.)")
+    def post_messages(self, message, on_sent: Optional[Callable[[], None]] = None):
+        """ Queue a message for this room and return without waiting for the rate limit.
+
+        on_sent, if given, is called without arguments on the sending thread once the message has been posted.
+        """
+        if not self.session_token:
+            logging.error(f"This room {self.room_id} has no active session. Posting messages failed.")
+            return
+        with self.__outbox_lock:
+            self.__outbox.append((time.monotonic(), message, on_sent))
+        # The shared flusher thread sends it as soon as the rate limit allows, never on the caller's thread
+        OUTBOX_FLUSHER.schedule(self)
+
+    def flush_messages(self, block=False) -> int:
+        """ Send queued messages while the rate limit allows (or until the queue is empty if block=True).
+
+        Returns the number of posts sent by this call (fewer than the messages when they are coalesced).
+        """
+        if not self.__send_lock.acquire(blocking=block):
+            return 0  # another thread is already sending this room's messages
+        sent = 0
+        try:
+            while True:
+                with self.__outbox_lock:
+                    if not self.__outbox or (not block and self.__coalesce_hold() > 0):
+                        break
+                if not self.__post_bucket.try_acquire():
+                    if not block:
+                        break
+                    time.sleep(self.__post_bucket.wait_time())
+                    continue
+                with self.__outbox_lock:
+                    message, callbacks = self.__next_post()
+                if self.__send_message(message):
+                    self.__run_callbacks(callbacks)
+                sent += 1
+        finally:
+            self.__send_lock.release()
+        return sent
+
+    def next_flush_in(self) -> Optional[float]:
+        """ Seconds until queued messages can be sent, or None if the queue is empty. """
+        with self.__outbox_lock:
+            if not self.__outbox:
+                return None
+            hold = self.__coalesce_hold()
+        return max(hold, self.__post_bucket.wait_time())
+
+    def __coalesce_hold(self) -> float:
+        """ Seconds the oldest queued message still waits for follow-ups (call with the outbox lock held). """
+        if self.__coalesce_window <= 0:
+            return 0
+        if sum(len(message) for _, message, _ in self.__outbox) >= self.__coalesce_max_chars:
+            return 0  # a full post is ready
+        return max(0.0, self.__outbox[0][0] + self.__coalesce_window - time.monotonic())
+
+    def __next_post(self) -> Tuple[str, List[Callable[[], None]]]:
+        """ Pop the next post off the outbox, merging consecutive messages up to coalesce_max_chars.
+
+        Returns the post and the on_sent callbacks of the messages it contains.
+        """
+        _, post, on_sent = self.__outbox.popleft()
+        callbacks = [on_sent] if on_sent else []
+        if self.__coalesce_window <= 0:
+            return post, callbacks
+        while self.__outbox and len(post) + 1 + len(self.__outbox[0][1]) <= self.__coalesce_max_chars:
+            _, message, on_sent = self.__outbox.popleft()
+            post += "\n" + message
+            if on_sent:
+                callbacks.append(on_sent)
+        return post, callbacks
+
+    def __send_message(self, message) -> bool:
+        """ Post a message to the room; returns whether the server accepted it. """
+        try:
+            response = self.chat_api.post_api_room_with_roomid(
+                room_id=self.room_id, session=self.session_token, body=message,
+                _request_timeout=self.__request_timeout)
+            if not response:
+                logging.error(f"Failed to post message to room {self.room_id}.")
+            return bool(response)
+        except Exception as e:
+            logging.error(f"An error occurred while posting the message to room {self.room_id}: {e}")
+            return False
+
+    def __run_callbacks(self, callbacks: List[Callable[[], None]]):
+        for on_sent in callbacks:
             try:
-                response = self.chat_api.post_api_room_with_roomid(
-                    room_id=self.room_id, session=self.session_token, body=message)
-                if not response:
-                    logging.error(f"Failed to post message to room {self.room_id}.")
+                on_sent()
             except Exception as e:
-                logging.error(f"An error occurred while posting the message to room {self.room_id}:", e)
+                logging.error(f"An error occurred in the on_sent callback of room {self.room_id}: {e}")
 
-            self.__last_post_call = time.time()  # store the completed time
-        else:
-            logging.error(f"This room {self.room_id} has no active session. Posting messages failed.")
+    def evict_state(self):
+        """ Drop the cached messages and reactions, e.g. once the room has expired; the room itself stays usable. """
+        with self.__state_lock:
+            self.__state_api_cache = None
+            self.__message_ordinals = set()
+            self.__new_message_cursor = {True: 0, False: 0}
 
-    def mark_as_processed(self, msg_or_rec: Union[RestChatMessage, ChatMessageReaction]):
-        if isinstance(msg_or_rec, RestChatMessage):
-            self.processed_ordinals['messages'].append(msg_or_rec.ordinal)
-        elif isinstance(msg_or_rec, ChatMessageReaction):
-            self.processed_ordinals['reactions'].append(msg_or_rec.message_ordinal)
+    def mark_as_processed(self, msg_or_rec: Union[RestChatMessage, ChatMessageReaction,
+                                                  ChatMessageRecord, ReactionRecord]):
+        if isinstance(msg_or_rec, (RestChatMessage, ChatMessageRecord)):
+            self.processed_ordinals['messages'].add(msg_or_rec.ordinal)
+        elif isinstance(msg_or_rec, (ChatMessageReaction, ReactionRecord)):
+            self.processed_ordinals['reactions'].add(msg_or_rec.message_ordinal)
         else:
             logging.error("Please pass a message or reaction object to mark it as processed.")
 
@@ -0,0 +1,130 @@
+import statistics
+import threading
+import time
+
+from collections import deque
+from typing import Dict, List, Optional
+
+
+class PollScheduler:
+    def __init__(self,
+                 min_interval: float = 1.0,
+                 max_interval: float = 10.0,
+                 idle_after: float = 60.0,
+                 near_expiry: float = 60.0,
+                 rooms_interval: float = 5.0,
+                 baseline_interval: float = 2.0):
+        """PollScheduler - decides which rooms are worth polling now.
+
+        A room is polled every min_interval seconds right after its last new message, and the interval grows
+        linearly to max_interval as the room stays idle for idle_after seconds. Rooms with less than near_expiry
+        seconds left are polled at half that rate (never slower than max_interval), and the list of rooms itself
+        is refreshed every rooms_interval seconds.
+
+        Args:
+            min_interval (float, optional): Seconds between polls of an active room. Defaults to 1.
+            max_interval (float, optional): Seconds between polls of an idle room. Defaults to 10.
+            idle_after (float, optional): Seconds without new messages after which a room counts as idle. Defaults to 60.
+            near_expiry (float, optional): Remaining seconds below which a room counts as about to expire. Defaults to 60.
+            rooms_interval (float, optional): Seconds between two refreshes of the room list. Defaults to 5.
+            baseline_interval (float, optional): Interval of the fixed polling loop the savings are measured against
+                (one room list request plus one state request per active room). Defaults to 2.
+        """
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.idle_after = idle_after
+        self.near_expiry = near_expiry
+        self.rooms_interval = rooms_interval
+        self.baseline_interval = baseline_interval
+
+        self._next_poll: Dict[str, float] = {}  # room_id -> monotonic time the room is due
+        self._last_activity: Dict[str, float] = {}  # room_id -> monotonic time a new message was last seen
+        self._last_message_timestamp: Dict[str, int] = {}  # room_id -> newest message timestamp seen so far
+        self._next_rooms_poll = 0.0
+        self._last_tick: Optional[float] = None
+        self._lock = threading.Lock()
+
+        # metrics
+        self.room_polls = 0
+        self.rooms_polls = 0
+        self.baseline_requests = 0.0
+        self._reply_latencies = deque(maxlen=1000)  # seconds, most recent replies only
+
+    def interval(self, room, now: Optional[float] = None) -> float:
+        """ Seconds until the room should be polled again. """
+        now = time.monotonic() if now is None else now
+        idle_time = now - self._last_activity.get(room.room_id, now)
+        interval = self.min_interval + (self.max_interval - self.min_interval) * min(1.0, idle_time / self.idle_after)
+        if room.remaining_time / 1000 < self.near_expiry:
+            interval = min(2 * interval, self.max_interval)
+        return interval
+
+    def rooms_due(self) -> bool:
+        """ Whether the room list should be refreshed now; counts the refresh if so. """
+        now = time.monotonic()
+        with self._lock:
+            if now < self._next_rooms_poll:
+                return False
+            self._next_rooms_poll = now + self.rooms_interval
+            self.rooms_polls += 1
+            return True
+
+    def due_rooms(self, rooms: List) -> List:
+        """ Active rooms that are due for a state poll; each returned room counts as polled. """
+        now = time.monotonic()
+        due = []
+        with self._lock:
+            # Forget rooms that expired or were removed
+            room_ids = {room.room_id for room in rooms}
+            self._next_poll = {room_id: t for room_id, t in self._next_poll.items() if room_id in room_ids}
+            self._last_activity = {room_id: t for room_id, t in self._last_activity.items() if room_id in room_ids}
+            self._last_message_timestamp = {room_id: t for room_id, t in self._last_message_timestamp.items()
+                                            if room_id in room_ids}
+
+            if self._last_tick is not None:
+                # What the fixed loop would have requested since the previous call
+                self.baseline_requests += (now - self._last_tick) / self.baseline_interval * (1 + len(rooms))
+            self._last_tick = now
+
+            for room in rooms:
+                last_message_timestamp = room.last_message_timestamp
+                if last_message_timestamp != self._last_message_timestamp.get(room.room_id):
+                    # New messages arrived (or the room is new): the conversation is active
+                    self._last_message_timestamp[room.room_id] = last_message_timestamp
+                    self._last_activity[room.room_id] = now
+                if now >= self._next_poll.get(room.room_id, 0.0):
+                    self._next_poll[room.room_id] = now + self.interval(room, now)
+                    self.room_polls += 1
+                    due.append(room)
+        return due
+
+    def next_poll_in(self) -> float:
+        """ Seconds until the next room (or the room list) is due. """
+        now = time.monotonic()
+        with self._lock:
+            next_poll = min(list(self._next_poll.values()) + [self._next_rooms_poll])
+        return max(0.0, next_poll - now)
+
+    def wake(self):
+        """ Make every room due now, e.g. when the bot has something new to tell all of them. """
+        with self._lock:
+            self._next_poll = dict.fromkeys(self._next_poll, 0.0)
+
+    def record_reply(self, message):
+        """ Record the latency between a partner message (ChatMessageRecord) and the bot's reply to it.
+
+        Call it once the reply has been posted, e.g. as the on_sent callback of Chatroom.post_messages.
+        """
+        latency = max(0.0, time.time() - message.time_stamp / 1000)
+        with self._lock:
+            self._reply_latencies.append(latency)
+
+    def stats(self):
+        with self._lock:
+            requests = self.room_polls + self.rooms_polls
+            return {
+                "requests": requests,
+                "baseline_requests": int(self.baseline_requests),
+                "requests_saved": max(0, int(self.baseline_requests) - requests),
+                "median_reply_latency": statistics.median(self._reply_latencies) if self._reply_latencies else None,
+            }
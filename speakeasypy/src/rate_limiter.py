@@ -0,0 +1,96 @@
+import logging
+import threading
+import time
+
+from typing import Optional
+
+
+class TokenBucket:
+    def __init__(self, request_limit: float, capacity: float = 1):
+        """TokenBucket - a rate limiter that never blocks the caller.
+
+        Args:
+            request_limit (float): Seconds needed to earn one token (0 disables the limit).
+            capacity (float, optional): Maximum number of tokens that can be saved up. Defaults to 1.
+        """
+        self.request_limit = request_limit
+        self.capacity = capacity
+        self._tokens = capacity
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        if self.request_limit > 0:
+            self._tokens = min(self.capacity, self._tokens + (now - self._last_refill) / self.request_limit)
+        else:
+            self._tokens = self.capacity
+        self._last_refill = now
+
+    def try_acquire(self) -> bool:
+        """ Take a token if one is available and return whether it was. """
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+    def wait_time(self) -> float:
+        """ Seconds until the next token is available (0 if one is available now). """
+        with self._lock:
+            self._refill()
+            return max(0.0, (1 - self._tokens) * self.request_limit)
+
+
+class OutboxFlusher:
+    def __init__(self, max_sleep: float = 1.0):
+        """OutboxFlusher - one background thread that sends the queued messages of all chatrooms.
+
+        Chatrooms schedule themselves whenever a message is queued; the thread flushes
+        each of them as soon as its rate limit allows, so no caller has to sleep.
+
+        Args:
+            max_sleep (float, optional): Upper bound in seconds between two passes over the scheduled rooms.
+        """
+        self.max_sleep = max_sleep
+        self._rooms = {}  # room_id -> Chatroom with pending messages
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def schedule(self, room):
+        with self._condition:
+            self._rooms[room.room_id] = room
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="speakeasy-outbox", daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._rooms:
+                    self._condition.wait()
+                rooms = list(self._rooms.values())
+
+            sleep_time = self.max_sleep
+            for room in rooms:
+                try:
+                    room.flush_messages()
+                except Exception as e:
+                    logging.error(f"An error occurred while flushing the messages of room {room.room_id}: {e}")
+                with self._condition:
+                    # Checked under the lock so a concurrent schedule() cannot be dropped
+                    wait_time = room.next_flush_in()
+                    if wait_time is None:
+                        self._rooms.pop(room.room_id, None)
+                    else:
+                        sleep_time = min(sleep_time, wait_time)
+
+            with self._condition:
+                if self._rooms:
+                    self._condition.wait(timeout=max(sleep_time, 0.01))
+
+
+# Shared by all chatrooms of the process
+OUTBOX_FLUSHER = OutboxFlusher()
@@ -0,0 +1,86 @@
+import json
+
+from typing import List, Optional
+from speakeasypy.openapi.client.model_utils import model_to_dict
+
+
+class ChatMessageRecord:
+    """ Compact stand-in for RestChatMessage with the same attribute names, without type checking. """
+    __slots__ = ('time_stamp', 'author_alias', 'ordinal', 'message')
+
+    def __init__(self, time_stamp: int, author_alias: str, ordinal: int, message: str):
+        self.time_stamp = time_stamp
+        self.author_alias = author_alias
+        self.ordinal = ordinal
+        self.message = message
+
+    @classmethod
+    def from_json(cls, data: dict) -> 'ChatMessageRecord':
+        return cls(data.get('timeStamp'), data.get('authorAlias'), data.get('ordinal'), data.get('message'))
+
+    @classmethod
+    def from_model(cls, message) -> 'ChatMessageRecord':
+        """ Copy a generated RestChatMessage. """
+        return cls(message.get('time_stamp'), message.get('author_alias'), message.get('ordinal'),
+                   message.get('message'))
+
+    def __repr__(self):
+        return (f"ChatMessageRecord(time_stamp={self.time_stamp!r}, author_alias={self.author_alias!r}, "
+                f"ordinal={self.ordinal!r}, message={self.message!r})")
+
+
+class ReactionRecord:
+    """ Compact stand-in for ChatMessageReaction with the same attribute names, without type checking. """
+    __slots__ = ('message_ordinal', 'type')
+
+    def __init__(self, message_ordinal: int, type: str):
+        self.message_ordinal = message_ordinal
+        self.type = type
+
+    @classmethod
+    def from_json(cls, data: dict) -> 'ReactionRecord':
+        return cls(data.get('messageOrdinal'), data.get('type'))
+
+    @classmethod
+    def from_model(cls, reaction) -> 'ReactionRecord':
+        """ Copy a generated ChatMessageReaction. """
+        return cls(reaction.get('message_ordinal'), reaction.get('type'))
+
+    def __repr__(self):
+        return f"ReactionRecord(message_ordinal={self.message_ordinal!r}, type={self.type!r})"
+
+
+class ChatRoomStateRecord:
+    """ Compact stand-in for ChatRoomState; info is kept as the raw JSON dict (camelCase keys). """
+    __slots__ = ('info', 'messages', 'reactions')
+
+    def __init__(self, info: Optional[dict], messages: List[ChatMessageRecord], reactions: List[ReactionRecord]):
+        self.info = info
+        self.messages = messages
+        self.reactions = reactions
+
+    @classmethod
+    def from_json(cls, data: dict) -> 'ChatRoomStateRecord':
+        return cls(data.get('info'),
+                   [ChatMessageRecord.from_json(m) for m in data.get('messages') or []],
+                   [ReactionRecord.from_json(r) for r in data.get('reactions') or []])
+
+    @classmethod
+    def from_model(cls, state) -> 'ChatRoomStateRecord':
+        """ Copy a generated ChatRoomState, so the model objects (and their per-instance dicts) can be freed. """
+        info = state.get('info')
+        return cls(model_to_dict(info, serialize=True) if info is not None else None,
+                   [ChatMessageRecord.from_model(m) for m in state.get('messages') or []],
+                   [ReactionRecord.from_model(r) for r in state.get('reactions') or []])
+
+    def __repr__(self):
+        return (f"ChatRoomStateRecord(info={self.info!r}, messages=<{len(self.messages)} messages>, "
+                f"reactions=<{len(self.reactions)} reactions>)")
+
+
+def decode_room_state(response) -> ChatRoomStateRecord:
+    """ Decode the body of a raw /api/room/{roomId}/{since} response (requested with _preload_content=False). """
+    try:
+        return ChatRoomStateRecord.from_json(json.loads(response.data))
+    finally:
+        response.release_conn()
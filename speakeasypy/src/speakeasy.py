@@ -4,22 +4,113 @@ from speakeasypy.openapi.client.apis import ChatApi
 from speakeasypy.openapi.client.api_client import ApiClient
 from speakeasypy.openapi.client.models import LoginRequest
 from speakeasypy.src.chatroom import Chatroom
-from typing import Dict, List
+from speakeasypy.src.poll_scheduler import PollScheduler
+from typing import Dict, List, Optional, Tuple, Union
+from urllib3.connection import HTTPConnection
+from urllib3.util.retry import Retry
 
 import logging
 import atexit
+import socket
+import threading
 import time
 
 
+def keepalive_socket_options() -> list:
+    """ urllib3's default socket options plus TCP keep-alive probes, so idle pooled connections stay usable. """
+    options = HTTPConnection.default_socket_options + [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+    # Not every platform exposes the keep-alive timings (e.g. macOS lacks TCP_KEEPIDLE)
+    for name, value in (('TCP_KEEPIDLE', 60), ('TCP_KEEPINTVL', 15), ('TCP_KEEPCNT', 4)):
+        if hasattr(socket, name):
+            options.append((socket.IPPROTO_TCP, getattr(socket, name), value))
+    return options
+
+
+class PoolFullCounter(logging.Filter):
+    """ Counts urllib3's "Connection pool is full, discarding connection" warnings (connections that were
+    opened for a request but could not be kept for reuse because every slot of the pool was taken). """
+
+    def __init__(self):
+        super().__init__()
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.getMessage().startswith("Connection pool is full"):
+            with self._lock:
+                self.count += 1
+                first = self.count == 1
+            if first:
+                logging.error("The HTTP connection pool is exhausted: connections are discarded instead of reused. "
+                              "Pass a larger pool_maxsize to Speakeasy (or pool_block=True to wait for a free one).")
+        return True
+
+
+# One filter for the whole process: urllib3 logs every pool's warnings through the same logger
+POOL_FULL_COUNTER = PoolFullCounter()
+logging.getLogger("urllib3.connectionpool").addFilter(POOL_FULL_COUNTER)
+
+
 class Speakeasy:
     def __init__(self,
                  host: str,  # production: host = https://speakeasy.ifi.uzh.ch
                  username: str,
-                 password: str):
+                 password: str,
+                 coalesce_window: float = 0,
+                 coalesce_max_chars: int = 2000,
+                 poll_scheduler: Optional[PollScheduler] = None,
+                 pool_threads: int = 8,
+                 pool_maxsize: Optional[int] = None,
+                 pool_block: bool = False,
+                 keep_alive: bool = True,
+                 timeout: Optional[Union[float, Tuple[float, float]]] = None,
+                 retries: Optional[int] = None,
+                 backoff_factor: float = 0.5,
+                 fast_deserialize: bool = False):
+        """Speakeasy - the entry point for bots: login, logout and access to the chatrooms.
+
+        Args:
+            host (str): The Speakeasy server URL.
+            username (str): The bot's username.
+            password (str): The bot's password.
+            coalesce_window (float, optional): Passed to every Chatroom: seconds a queued message waits for follow-up
+                messages to be posted together with it. Defaults to 0 (no coalescing).
+            coalesce_max_chars (int, optional): Passed to every Chatroom: maximum length of a coalesced post.
+            poll_scheduler (PollScheduler, optional): Decides which rooms get_due_rooms returns. Defaults to a
+                PollScheduler with default intervals.
+            pool_threads (int, optional): Threads of the ApiClient pool used by refresh_all_rooms to fetch the states
+                of several rooms at once. Defaults to 8.
+            pool_maxsize (int, optional): Connections kept open to the server; should be at least the number of
+                threads sending requests concurrently. Defaults to the generated client's default (5 per CPU).
+            pool_block (bool, optional): If True, a request waits for a free pooled connection instead of opening an
+                extra one that is discarded afterwards. Defaults to False.
+            keep_alive (bool, optional): Enable TCP keep-alive on the pooled connections. Defaults to True.
+            timeout (float or (float, float), optional): Timeout in seconds of every request, or a
+                (connect, read) pair. Defaults to None (wait forever).
+            retries (int, optional): How often failed connections and 502/503/504 responses are retried, waiting
+                backoff_factor * 2 ** (retry - 1) seconds in between. Defaults to urllib3's default (3 retries).
+            backoff_factor (float, optional): See retries. Defaults to 0.5.
+            fast_deserialize (bool, optional): Passed to every Chatroom: decode room states straight from JSON into
+                the compact records (ChatMessageRecord, ReactionRecord) rooms cache, skipping the generated models.
+                Defaults to False.
+        """
 
         self.config = Configuration(host=host, username=username, password=password)
+        if pool_maxsize is not None:
+            self.config.connection_pool_maxsize = pool_maxsize
+        if keep_alive:
+            self.config.socket_options = keepalive_socket_options()
+        if retries is not None:
+            # POST is not retried by urllib3 (not idempotent), so a message is never posted twice
+            self.config.retries = Retry(total=retries, backoff_factor=backoff_factor,
+                                        status_forcelist=(502, 503, 504), raise_on_status=False)
         # Create an instance of the API client
-        self.api_client = ApiClient(configuration=self.config)
+        self.api_client = ApiClient(configuration=self.config, pool_threads=pool_threads)
+        # The generated client has no setting for it; PoolManager passes connection_pool_kw to every new pool
+        self.api_client.rest_client.pool_manager.connection_pool_kw['block'] = pool_block
+        # Timeout of every request (the generated client only supports it per call)
+        self.timeout = timeout
+        self.pool_full_counter = POOL_FULL_COUNTER  # shared by all Speakeasy instances of the process
         # Create api for user management (login / logout for bots)
         self.user_api = UserApi(self.api_client)
         # Create api for chat management with the current session token
@@ -28,8 +119,14 @@ class Speakeasy:
         self.session_token = None
         self._chatrooms_dict: Dict[str, Chatroom] = {}  # map room_id to Chatroom (cache)
         self.__last_call_for_rooms = 0
+        # Rooms dropped after they expired; the server keeps listing them, they must not be created again
+        self.__expired_room_ids = set()
 
         self.__request_limit = 1  # TODO: change the default value here!
+        self.__coalesce_window = coalesce_window
+        self.__coalesce_max_chars = coalesce_max_chars
+        self.__fast_deserialize = fast_deserialize
+        self.poll_scheduler = poll_scheduler or PollScheduler()
 
         logging.basicConfig(level=logging.INFO)
         atexit.register(self.logout)
@@ -39,7 +136,7 @@ class Speakeasy:
         login_request = LoginRequest(username=self.config.username, password=self.config.password)
 
         try:
-            response = self.user_api.post_api_login(login_request=login_request)
+            response = self.user_api.post_api_login(login_request=login_request, _request_timeout=self.timeout)
             if response:
                 user_session_details = response
                 # store the session token
@@ -54,8 +151,11 @@ class Speakeasy:
 
     def logout(self):
         if self.session_token:
+            # Send the messages still waiting for the post rate limit before the session ends
+            for room in self._chatrooms_dict.values():
+                room.flush_messages(block=True)
             try:
-                response = self.user_api.get_api_logout(session=self.session_token)
+                response = self.user_api.get_api_logout(session=self.session_token, _request_timeout=self.timeout)
                 if response:
                     print("Logout successful.")
                 else:
@@ -73,10 +173,17 @@ class Speakeasy:
             if elapsed_time >= self.__request_limit:
                 try:
                     # Call the get_api_rooms endpoint to fetch the list of chat rooms info
-                    response = self.chat_api.get_api_rooms(session=self.session_token)
+                    response = self.chat_api.get_api_rooms(session=self.session_token, _request_timeout=self.timeout)
                     if response:
                         chatroom_info_list = response.rooms
+                        # Only remember expired rooms the server still lists, so the set does not grow forever
+                        self.__expired_room_ids &= {room_info.uid for room_info in chatroom_info_list}
                         for room_info in chatroom_info_list:
+                            if room_info.uid in self.__expired_room_ids:
+                                continue
+                            if room_info.remaining_time <= 0:
+                                self.__drop_expired_room(room_info.uid)
+                                continue
                             # Convert responses from api into Chatroom instances and add new chatrooms
                             if room_info.uid not in self._chatrooms_dict.keys():
                                 self._chatrooms_dict[room_info.uid] = Chatroom(
@@ -88,7 +195,11 @@ class Speakeasy:
                                     user_aliases=room_info.user_aliases,
                                     session_token=self.session_token,
                                     chat_api=self.chat_api,
-                                    request_limit=self.__request_limit
+                                    request_limit=self.__request_limit,
+                                    coalesce_window=self.__coalesce_window,
+                                    coalesce_max_chars=self.__coalesce_max_chars,
+                                    request_timeout=self.timeout,
+                                    fast_deserialize=self.__fast_deserialize
                                 )
                             else:  # update remaining_time of existing chatrooms
                                 self._chatrooms_dict[room_info.uid].remaining_time = room_info.remaining_time
@@ -100,7 +211,19 @@ class Speakeasy:
         else:
             logging.error("No active session. Please login first.")
 
-    def get_rooms(self, active=True) -> List[Chatroom]:  # includes non-active chatrooms (i.e., remaining_time == 0)
+    def __drop_expired_room(self, room_id):
+        """ Forget an expired room so long-running bots do not keep every room they have ever seen. """
+        self.__expired_room_ids.add(room_id)
+        room = self._chatrooms_dict.pop(room_id, None)
+        if room is not None:
+            room.remaining_time = 0  # for callers still holding the room
+            room.evict_state()
+            # Last attempt to send queued messages; the outbox flusher keeps the room until its queue is empty
+            room.flush_messages()
+
+    def get_rooms(self, active=True) -> List[Chatroom]:
+        # active=False also includes rooms whose remaining_time dropped to 0 since the last room list update;
+        # rooms reported as expired by the room list are dropped.
         self.__update_chat_rooms()
 
         if active:  # only returns active chatrooms (i.e., remaining_time > 0)
@@ -111,5 +234,22 @@ class Speakeasy:
 
         return list(self._chatrooms_dict.values())
 
-
-
+    def get_due_rooms(self) -> List[Chatroom]:
+        """ Active chatrooms that are due for a poll, refreshing the room list only when it is due itself. """
+        if self.poll_scheduler.rooms_due():
+            self.__update_chat_rooms()
+        rooms = [room for room in list(self._chatrooms_dict.values()) if room.remaining_time > 0]
+        return self.poll_scheduler.due_rooms(rooms)
+
+    def refresh_all_rooms(self, rooms: Optional[List[Chatroom]] = None) -> List[Chatroom]:
+        """ Fetch the state of the given rooms (default: all active rooms) concurrently and wait for all of them.
+
+        The requests run on the ApiClient's thread pool, so one cycle takes as long as the slowest room instead of
+        the sum of all rooms. The following get_messages / get_reactions calls are then served from the room caches.
+        """
+        if rooms is None:
+            rooms = self.get_rooms(active=True)
+        pending = [(room, room.begin_state_update(async_req=True)) for room in rooms]
+        for room, update in pending:
+            room.complete_state_update(update)
+        return rooms
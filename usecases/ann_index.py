@@ -0,0 +1,125 @@
+import numpy as np
+import logging
+import os
+import time
+from graph_snapshot import atomic_write
+from vector_search import top_k
+
+
+class IVFIndex:
+    """
+    Inverted-file (IVF) index for approximate cosine search over unit-normalized vectors.
+
+    The vectors are clustered with spherical k-means. A query only scores the vectors stored
+    in the `nprobe` lists whose centroids are most similar to it, so raising `nprobe` trades
+    speed for recall.
+    """
+
+    def __init__(self, centroids, list_offsets, list_rows, nprobe=8):
+        self.centroids = centroids  # (n_lists x dim) unit-normalized centroids
+        self.list_offsets = list_offsets  # list c holds list_rows[list_offsets[c]:list_offsets[c + 1]]
+        self.list_rows = list_rows  # vector rows grouped by list
+        self.nprobe = nprobe
+
+    @classmethod
+    def build(cls, vectors, n_lists=1024, n_iter=10, sample_size=65536, nprobe=8, seed=0):
+        """
+        Train the centroids on a random sample of `vectors` and assign every vector to its closest list.
+        """
+        rng = np.random.default_rng(seed)
+        n_lists = min(n_lists, len(vectors))
+        sample = np.asarray(vectors[np.sort(rng.choice(len(vectors), min(sample_size, len(vectors)), replace=False))],
+                            dtype=np.float32)
+        centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+
+        for iteration in range(n_iter):
+            assignments = cls._assign(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, sample)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            # Lists that lost all their members keep their previous centroid
+            non_empty = norms[:, 0] > 0
+            centroids[non_empty] = sums[non_empty] / norms[non_empty]
+            logging.info(f"IVF k-means iteration {iteration + 1}/{n_iter}, empty lists: {np.sum(~non_empty)}")
+
+        assignments = cls._assign(vectors, centroids)
+        list_rows = np.argsort(assignments, kind="stable").astype(np.int64)
+        list_offsets = np.concatenate(([0], np.cumsum(np.bincount(assignments, minlength=n_lists))))
+        return cls(centroids, list_offsets, list_rows, nprobe=nprobe)
+
+    @staticmethod
+    def _assign(vectors, centroids, chunk_size=16384):
+        """ Index of the most similar centroid for every vector, computed in chunks to bound memory. """
+        assignments = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), chunk_size):
+            assignments[start:start + chunk_size] = np.argmax(vectors[start:start + chunk_size] @ centroids.T, axis=1)
+        return assignments
+
+    def candidates(self, query, nprobe=None):
+        """
+        Rows stored in the `nprobe` lists closest to the (unit-normalized) query.
+        """
+        probe, _ = top_k(self.centroids @ query, nprobe or self.nprobe)
+        return np.concatenate([self.list_rows[self.list_offsets[c]:self.list_offsets[c + 1]] for c in probe])
+
+    def search(self, vectors, query, k, nprobe=None, exclude=None):
+        """
+        Approximate top-k search; returns (rows, scores) ordered like vector_search.top_k.
+        """
+        rows = self.candidates(query, nprobe)
+        return top_k(vectors[rows] @ query, k, ids=rows, exclude=exclude)
+
+    def save(self, file_path):
+        atomic_write(file_path, lambda f: np.savez(f, centroids=self.centroids, list_offsets=self.list_offsets,
+                                                   list_rows=self.list_rows))
+
+    @classmethod
+    def load(cls, file_path, nprobe=8):
+        with np.load(file_path) as data:
+            return cls(data["centroids"], data["list_offsets"], data["list_rows"], nprobe=nprobe)
+
+
+def recall_at_k(index, vectors, k=10, n_queries=200, nprobe=None, seed=0):
+    """
+    Compare the index against exact search on randomly sampled rows of `vectors`.
+    Returns recall@k and the mean latency per query (ms) of both searches.
+    """
+    rng = np.random.default_rng(seed)
+    query_rows = rng.choice(len(vectors), min(n_queries, len(vectors)), replace=False)
+    hits, exact_time, ann_time = 0, 0.0, 0.0
+    for row in query_rows:
+        query = np.asarray(vectors[row])
+
+        start = time.perf_counter()
+        exact_rows, _ = top_k(vectors @ query, k, exclude=row)
+        exact_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        ann_rows, _ = index.search(vectors, query, k, nprobe=nprobe, exclude=row)
+        ann_time += time.perf_counter() - start
+
+        hits += len(np.intersect1d(exact_rows, ann_rows))
+    return {
+        "nprobe": nprobe or index.nprobe,
+        "recall": hits / (k * len(query_rows)),
+        "exact_ms": 1000 * exact_time / len(query_rows),
+        "ann_ms": 1000 * ann_time / len(query_rows),
+    }
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    embeds_path = "Datasets/ddis-graph-embeddings/entity_embeds_norm.npy"
+    index_path = "Datasets/ddis-graph-embeddings/entity_embeds_ivf.npz"
+
+    entity_embeds_norm = np.load(embeds_path, mmap_mode="r")
+    if os.path.exists(index_path):
+        ivf_index = IVFIndex.load(index_path)
+    else:
+        ivf_index = IVFIndex.build(entity_embeds_norm)
+        ivf_index.save(index_path)
+
+    for probes in (1, 4, 8, 16, 32, 64):
+        report = recall_at_k(ivf_index, entity_embeds_norm, k=10, nprobe=probes)
+        print(f"nprobe={report['nprobe']:3d}  recall@10={report['recall']:.3f}  "
+              f"exact={report['exact_ms']:.2f}ms  ann={report['ann_ms']:.2f}ms")
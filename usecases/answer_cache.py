@@ -0,0 +1,81 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class AnswerCache:
+    """
+    Thread-safe LRU cache with an optional time-to-live for the bot's answers.
+
+    Answers are keyed on the normalized entity and the detected intent. Calling set_version
+    with a different value (e.g. the fingerprint of a new graph snapshot) drops every entry.
+    """
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl  # seconds, None keeps entries until they are evicted
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (expiry time or None, answer)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(entity, intent):
+        return " ".join(entity.lower().split()), intent
+
+    def get(self, entity, intent):
+        key = self.make_key(entity, intent)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry[0] is None or entry[0] > time.time()):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]  # expired
+            self.misses += 1
+            return None
+
+    def put(self, entity, intent, answer):
+        key = self.make_key(entity, intent)
+        expiry = time.time() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._entries[key] = (expiry, answer)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get_or_compute(self, entity, intent, compute):
+        """
+        Return the cached answer, or compute, store and return it.
+        """
+        answer = self.get(entity, intent)
+        if answer is None:
+            answer = compute()
+            if answer is not None:
+                self.put(entity, intent, answer)
+        return answer
+
+    def set_version(self, version):
+        """
+        Invalidate all answers if the underlying data changed.
+        """
+        with self._lock:
+            if version != self.version:
+                self._entries.clear()
+                self.version = version
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "size": len(self._entries),
+            }
@@ -1,37 +1,116 @@
-import spacy
-from speakeasypy import Speakeasy, Chatroom
+from speakeasypy import Speakeasy, Chatroom, AsyncSpeakeasy
 from typing import List
 import time
-from rdflib import Graph
 from embedding_handler_v2 import EmbeddingHandler
-import re
-from rapidfuzz import process, fuzz  # Import 'fuzz' along with 'process'
+from graph_snapshot import load_graph, source_fingerprint
+from answer_cache import AnswerCache
+from nlp_backends import load_pipeline, extract_entity
+from gazetteer import TitleMatcher
+from fuzzy_index import TrigramIndex
+from rdflib import RDFS, Literal, Namespace, URIRef
+from rdflib.plugins.sparql import prepareQuery
+from rapidfuzz import fuzz
+import asyncio
 import logging
+import multiprocessing
 import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
 from speakeasypy.openapi.client.exceptions import ApiException
 
 # Initialize logging
 logging.basicConfig(level=logging.INFO)
 
-# Load spaCy for NLP
-nlp = spacy.load("en_core_web_trf")
-
 DEFAULT_HOST_URL = 'https://speakeasy.ifi.uzh.ch'
+WD = Namespace("http://www.wikidata.org/entity/")
+WDT = Namespace("http://www.wikidata.org/prop/direct/")
 listen_freq = 2
 
+# SPARQL templates, parsed and compiled once at import and executed with initBindings
+SPARQL_TEMPLATES = {
+    'description': prepareQuery(
+        '''
+        SELECT ?description WHERE {
+            ?film ns2:description ?description .
+            FILTER (lang(?description) = "en")
+        }
+        ''',
+        initNs={'ns2': Namespace("http://schema.org/")},
+    ),
+}
+
+# Per-process state of the NLP worker pool (see Agent.start_nlp_workers)
+_worker_nlp = None
+_worker_title_matcher = None
+
+
+def _init_nlp_worker(backend, title_labels, title_matcher_path, fingerprint):
+    global _worker_nlp, _worker_title_matcher
+    _worker_nlp = load_pipeline(backend, title_labels)
+    _worker_title_matcher = TitleMatcher.load(title_matcher_path, fingerprint)
+
+
+def _extract_entity_in_worker(query):
+    return extract_entity(_worker_nlp, query, _worker_title_matcher)
+
+
+def build_label_index(graph):
+    """
+    Map case-folded English labels to the entities carrying them, and entities to their English label.
+    """
+    label_index = {}
+    entity_labels = {}
+    for entity, label in graph.subject_objects(RDFS.label):
+        if getattr(label, 'language', None) == 'en':
+            label_index.setdefault(str(label).lower(), []).append(entity)
+            entity_labels.setdefault(entity, str(label))
+    return label_index, entity_labels
+
+
+def movie_labels(graph, entity_labels=None):
+    """
+    English labels of all films (instances of wd:Q11424) in the graph.
+    entity_labels (entity -> English label, see build_label_index) is built from the graph when not given.
+    """
+    if entity_labels is None:
+        _, entity_labels = build_label_index(graph)
+    films = set(graph.subjects(WDT.P31, WD.Q11424))
+    return [entity_labels[film] for film in films if film in entity_labels]
+
+
 class Agent:
-    def __init__(self, username, password, graph_file):
+    def __init__(self, username, password, graph_file, nlp_backend="trf", workers=0, nlp_workers=0,
+                 coalesce_window=0.5):
+        """
+        workers > 0 processes rooms concurrently on a thread pool of that size (one task in flight per room).
+        nlp_workers > 0 runs entity extraction in a pool of that many processes, each with its own spaCy pipeline.
+        coalesce_window: replies (status messages, answers) queued for a room within this many seconds
+        are sent as one post; 0 posts each of them separately.
+        """
         self.username = username
         self.graph_file = graph_file
+        self.nlp_backend = nlp_backend  # see nlp_backends.load_pipeline
+        self.nlp_workers = nlp_workers
+        self.room_executor = ThreadPoolExecutor(max_workers=workers) if workers > 0 else None
+        self.room_futures = {}  # room_id -> Future of the room's task in flight
+        self.nlp_executor = None
+        # spaCy pipelines are not thread-safe; serializes extraction when it runs in this process
+        self.nlp_lock = threading.Lock()
         self.knowledge_graph_loaded = False  # Initialize flag
         self.initialization_complete = False  # Existing flag
+        # Answers keyed on (entity, intent); dropped whenever the graph file changes
+        self.answer_cache = AnswerCache(maxsize=1024, ttl=3600)
     
 
 
         # Initialize Speakeasy
         try:
             self.speakeasy = Speakeasy(
-                host=DEFAULT_HOST_URL, username=username, password=password
+                host=DEFAULT_HOST_URL, username=username, password=password,
+                coalesce_window=coalesce_window,
+                # Room workers, the state fan-out pool and the outbox flusher may all hold a connection
+                pool_maxsize=max(16, 8 + workers + 1), timeout=(5, 30), retries=3,
+                fast_deserialize=True
             )
             self.speakeasy.login()
             logging.info("Speakeasy login successful.")
@@ -46,26 +125,95 @@ class Agent:
         """
         Load the knowledge graph and embeddings in a background thread.
         """
-        # Load the knowledge graph
-        self.graph = Graph()
+        # Load the knowledge graph (from its binary snapshot when it is up to date)
         try:
-            self.graph.parse(self.graph_file, format="turtle")
+            self.graph = load_graph(self.graph_file)
+            self.label_index, self.entity_labels = build_label_index(self.graph)
+            self.answer_cache.set_version(source_fingerprint(self.graph_file))
             logging.info("Knowledge graph loaded successfully.")
             self.knowledge_graph_loaded = True  # Set the flag here
+            self.speakeasy.poll_scheduler.wake()  # every room is due for the "graph loaded" message
         except Exception as e:
             logging.error(f"Error parsing the graph: {str(e)}")
             exit(1)
 
-        # Initialize EmbeddingHandler
-        self.embedding_handler = EmbeddingHandler()
+        # Initialize EmbeddingHandler, reusing the graph parsed above for the entity labels
+        self.embedding_handler = EmbeddingHandler(graph=self.graph)
+
+        # Labels considered by the fuzzy-matching fallback, filtered once
+        self.fuzzy_labels = self.build_fuzzy_labels()
+        # Trigram blocking index that shortlists fuzzy candidates before WRatio scoring
+        self.fuzzy_index = TrigramIndex(self.fuzzy_labels)
+
+        # Matcher for the longest known title in a message, cached on disk next to the graph
+        self.title_matcher = TitleMatcher.load_or_build(
+            f"{self.graph_file}.titles.pkl", source_fingerprint(self.graph_file), self.embedding_handler.ent2lbl.values())
+
+        # Load the spaCy pipeline for entity extraction; the "ruler" backend matches the graph's movie titles
+        title_labels = movie_labels(self.graph, self.entity_labels) if self.nlp_backend == "ruler" else None
+        if self.nlp_workers > 0:
+            self.start_nlp_workers(title_labels)
+        else:
+            self.nlp = load_pipeline(self.nlp_backend, title_labels)
 
         # Set initialization complete flag
         self.initialization_complete = True
+        self.speakeasy.poll_scheduler.wake()  # every room is due for the welcome message
         logging.info("Initialization complete.")
 
 
 
 
+    def start_nlp_workers(self, title_labels):
+        """
+        Start the process pool for entity extraction. Workers load their own pipeline and the
+        title matcher saved on disk, so nothing large is sent per message.
+        """
+        self.nlp_executor = ProcessPoolExecutor(
+            max_workers=self.nlp_workers,
+            # spawn rather than fork: this runs while other threads of the bot are active
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_nlp_worker,
+            initargs=(self.nlp_backend, title_labels, f"{self.graph_file}.titles.pkl",
+                      source_fingerprint(self.graph_file)),
+        )
+
+    def find_entity(self, query):
+        """
+        Extract the entity of a question, on the NLP worker pool when there is one.
+        """
+        if self.nlp_executor is not None:
+            return self.nlp_executor.submit(_extract_entity_in_worker, query).result()
+        with self.nlp_lock:
+            return extract_entity(self.nlp, query, self.title_matcher)
+
+    def resolve_entity(self, entity_label):
+        """
+        Find the entities whose English label matches entity_label (case-insensitive).
+        """
+        return self.label_index.get(entity_label.lower(), [])
+
+    def lookup(self, entity_uri, prop):
+        """
+        Single-hop lookup of the values of a wdt: property (e.g. "P57") directly on the graph.
+        Entity values are returned as their English label (entities without one are skipped),
+        literal values as strings.
+        """
+        values = []
+        for value in self.graph.objects(URIRef(entity_uri), WDT[prop]):
+            if isinstance(value, Literal):
+                values.append(str(value))
+            elif value in self.entity_labels:
+                values.append(self.entity_labels[value])
+        return values
+
+    def lookup_label(self, entity_label, prop):
+        """
+        Unique values of a wdt: property over all films matching entity_label.
+        """
+        values = [value for film in self.resolve_entity(entity_label) for value in self.lookup(film, prop)]
+        return list(dict.fromkeys(values))
+
     def initial_listen(self):
         """
         Listen for new chatrooms and send an initialization message.
@@ -84,164 +232,230 @@ class Agent:
         self.listen()
 
     def listen(self):
+        """
+        Serve the rooms the poll scheduler finds due: active conversations are polled every second or so,
+        idle and expiring rooms less often.
+        """
+        scheduler = self.speakeasy.poll_scheduler
+        last_report = time.time()
         while True:
-            rooms: List[Chatroom] = self.speakeasy.get_rooms(active=True)
+            rooms: List[Chatroom] = self.speakeasy.get_due_rooms()
+            # Only unfinished tasks matter (see room_busy); keeps room_futures bounded by the rooms in progress
+            self.room_futures = {room_id: future for room_id, future in self.room_futures.items()
+                                 if not future.done()}
+            # Fetch the due rooms' states in parallel; processing them then reads the cached states.
+            # Rooms still being processed by a worker are skipped: they fetch their own state and would not
+            # be resubmitted before their task finishes anyway.
+            self.speakeasy.refresh_all_rooms([room for room in rooms if not self.room_busy(room)])
             for room in rooms:
-                # Initialize room attributes if they don't exist
-                if not hasattr(room, 'initiated'):
-                    room.initiated = False
-                if not hasattr(room, 'loading_message_sent'):
-                    room.loading_message_sent = False
-                if not hasattr(room, 'graph_loaded_message_sent'):
-                    room.graph_loaded_message_sent = False
-
-                # Send loading message if not already sent
-                if not self.knowledge_graph_loaded and not room.loading_message_sent:
-                    try:
-                        room.post_messages(
-                            "Please wait, I'm loading. "
-                            "I'll be ready to chat shortly!"
-                        )
-                        room.loading_message_sent = True
-                    except Exception as e:
-                        logging.error(f"Error posting loading message to room {room.room_id}: {e}")
-
-                # Send knowledge graph loaded message as soon as it's loaded
-                if self.knowledge_graph_loaded and not room.graph_loaded_message_sent:
-                    try:
-                        room.post_messages("Knowledge graph loaded successfully :D")
-                        room.graph_loaded_message_sent = True
-                    except Exception as e:
-                        logging.error(f"Error posting graph loaded message to room {room.room_id}: {e}")
-
-                # Send welcome message after full initialization
-                if self.initialization_complete and not room.initiated:
-                    try:
-                        room.post_messages(
-                            f'Hello! This is an incredible welcome message from {room.my_alias}.'
-                        )
-                        room.initiated = True
-                    except Exception as e:
-                        logging.error(f"Error posting welcome message to room {room.room_id}: {e}")
-
-                # Only process messages if initialization is complete and the room is initiated
-                if self.initialization_complete and room.initiated:
-                    for message in room.get_messages(only_partner=True, only_new=True):
-                        print(
-                            f"\t- Chatroom {room.room_id} "
-                            f"- new message #{message.ordinal}: '{message.message}' "
-                            f"- {self.get_time()}"
-                        )
-
-                        response = self.handle_query(message.message)
-                        if response is None:
-                            response = "I'm sorry, I couldn't understand the question. Could you please rephrase it?"
-                        try:
-                            room.post_messages(response)
-                        except Exception as e:
-                            logging.error(f"Error posting response to room {room.room_id}: {e}")
-                        room.mark_as_processed(message)
-
-                    for reaction in room.get_reactions(only_new=True):
-                        print(
-                            f"\t- Chatroom {room.room_id} "
-                            f"- new reaction #{reaction.message_ordinal}: "
-                            f"'{reaction.type}' - {self.get_time()}"
-                        )
-
-                        try:
-                            room.post_messages(f"Received your reaction: '{reaction.type}'")
-                        except Exception as e:
-                            logging.error(f"Error posting reaction to room {room.room_id}: {e}")
-                        room.mark_as_processed(reaction)
-
-            time.sleep(listen_freq)
+                if self.room_executor is None:
+                    self.process_room(room)
+                else:
+                    self.submit_room(room)
+            if time.time() - last_report >= 60:
+                logging.info(f"Polling stats: {scheduler.stats()}")
+                logging.info(f"Answer cache: {self.answer_cache.stats()}")
+                last_report = time.time()
+            time.sleep(max(0.1, min(listen_freq, scheduler.next_poll_in())))
+
+    def room_busy(self, room):
+        """
+        Whether a task of the worker pool is still processing the room.
+        """
+        future = self.room_futures.get(room.room_id)
+        return future is not None and not future.done()
 
+    def submit_room(self, room):
+        """
+        Process a room on the worker pool. Each room has at most one task in flight, so its
+        messages are still answered one after another, in order.
+        """
+        if self.room_busy(room):
+            return
+        future = self.room_executor.submit(self.process_room, room)
+        future.add_done_callback(partial(self.log_room_failure, room.room_id))
+        self.room_futures[room.room_id] = future
 
-    def handle_query(self, query):
-        entity = None  # Initialize entity
+    @staticmethod
+    def log_room_failure(room_id, future):
+        if future.exception() is not None:
+            logging.error(f"Error processing room {room_id}: {future.exception()}")
 
-        # Analyze the question using NLP
-        doc = nlp(query)
+    def due_status_messages(self, room):
+        """
+        Status messages (loading, graph loaded, welcome) the room should receive now,
+        as (flag attribute, text) pairs. Set the flag on the room once the message is posted.
+        """
+        # Initialize room attributes if they don't exist
+        if not hasattr(room, 'initiated'):
+            room.initiated = False
+        if not hasattr(room, 'loading_message_sent'):
+            room.loading_message_sent = False
+        if not hasattr(room, 'graph_loaded_message_sent'):
+            room.graph_loaded_message_sent = False
+
+        due = []
+        # Send loading message if not already sent
+        if not self.knowledge_graph_loaded and not room.loading_message_sent:
+            due.append(('loading_message_sent', "Please wait, I'm loading. I'll be ready to chat shortly!"))
+
+        # Send knowledge graph loaded message as soon as it's loaded
+        if self.knowledge_graph_loaded and not room.graph_loaded_message_sent:
+            due.append(('graph_loaded_message_sent', "Knowledge graph loaded successfully :D"))
+
+        # Send welcome message after full initialization
+        if self.initialization_complete and not room.initiated:
+            due.append(('initiated', f'Hello! This is an incredible welcome message from {room.my_alias}.'))
+        return due
+
+    def answer_message(self, room, message):
+        """
+        Log a new message and build the reply to it.
+        """
+        print(
+            f"\t- Chatroom {room.room_id} "
+            f"- new message #{message.ordinal}: '{message.message}' "
+            f"- {self.get_time()}"
+        )
+
+        response = self.handle_query(message.message)
+        if response is None:
+            response = "I'm sorry, I couldn't understand the question. Could you please rephrase it?"
+        return response
+
+    def answer_reaction(self, room, reaction):
+        """
+        Log a new reaction and build the reply to it.
+        """
+        print(
+            f"\t- Chatroom {room.room_id} "
+            f"- new reaction #{reaction.message_ordinal}: "
+            f"'{reaction.type}' - {self.get_time()}"
+        )
+        return f"Received your reaction: '{reaction.type}'"
+
+    def process_room(self, room):
+        """
+        Send the status messages a room is due and answer its new messages and reactions.
+        """
+        for flag, text in self.due_status_messages(room):
+            try:
+                room.post_messages(text)
+                setattr(room, flag, True)
+            except Exception as e:
+                logging.error(f"Error posting status message to room {room.room_id}: {e}")
+
+        # Only process messages if initialization is complete and the room is initiated
+        if self.initialization_complete and room.initiated:
+            for message in room.get_messages(only_partner=True, only_new=True):
+                response = self.answer_message(room, message)
+                try:
+                    # The reply latency is recorded once the (possibly coalesced) reply has actually been posted
+                    room.post_messages(response, on_sent=partial(self.speakeasy.poll_scheduler.record_reply, message))
+                except Exception as e:
+                    logging.error(f"Error posting response to room {room.room_id}: {e}")
+                room.mark_as_processed(message)
+
+            for reaction in room.get_reactions(only_new=True):
+                try:
+                    room.post_messages(self.answer_reaction(room, reaction))
+                except Exception as e:
+                    logging.error(f"Error posting reaction to room {room.room_id}: {e}")
+                room.mark_as_processed(reaction)
+
+    def listen_async(self, max_workers=8):
+        """
+        asyncio variant of listen: every room is served by a coroutine on one event loop, and the
+        blocking API calls share a pool of max_workers threads.
+        """
+        asyncio.run(self.serve_async(max_workers))
 
-        # Define unwanted entities to exclude
-        unwanted_entities = set([
-            'who', 'what', 'when', 'where', 'why', 'how',
-            'director', 'screenwriter', 'writer', 'author',
-            'released', 'release date', 'published', 'movie', 'film', 'wrote', 'directed',
-        ])
+    async def serve_async(self, max_workers=8):
+        speakeasy = AsyncSpeakeasy(speakeasy=self.speakeasy, max_workers=max_workers)
+        room_tasks = {}  # room_id -> asyncio task of the room's processing in flight
+        while True:
+            room_tasks = {room_id: task for room_id, task in room_tasks.items() if not task.done()}
+            for room in await speakeasy.get_rooms(active=True):
+                # At most one task per room keeps replies within the room in message order
+                task = room_tasks.get(room.room_id)
+                if task is None or task.done():
+                    room_tasks[room.room_id] = asyncio.ensure_future(self.process_room_async(room))
+            await asyncio.sleep(listen_freq)
+
+    async def process_room_async(self, room):
+        """
+        Coroutine version of process_room for an AsyncChatroom.
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            for flag, text in self.due_status_messages(room):
+                await room.post_messages(text)
+                setattr(room, flag, True)
+
+            if self.initialization_complete and room.initiated:
+                for message in await room.get_messages(only_partner=True, only_new=True):
+                    # Answering is CPU-bound, keep it off the event loop
+                    response = await loop.run_in_executor(None, self.answer_message, room, message)
+                    await room.post_messages(response,
+                                             on_sent=partial(self.speakeasy.poll_scheduler.record_reply, message))
+                    room.mark_as_processed(message)
+
+                for reaction in await room.get_reactions(only_new=True):
+                    await room.post_messages(self.answer_reaction(room, reaction))
+                    room.mark_as_processed(reaction)
+        except Exception as e:
+            logging.error(f"Error processing room {room.room_id}: {e}")
 
-        # Prima cerca di estrarre il titolo tra virgolette
-        match = re.search(r'"([^"]+)"', query)
-        if match:
-            entity = match.group(1)
-            print(f"Entity extracted from quotes: {entity}")
 
-        # Se non trova entità tra virgolette, usa spaCy
+    def handle_query(self, query):
+        entity = self.find_entity(query)
         if not entity:
-            entities = [ent.text for ent in doc.ents if ent.label_ in ["WORK_OF_ART", "ORG", "EVENT"]]
-            entities = [ent for ent in entities if ent.lower() not in unwanted_entities]
-            print(f"Extracted entities after spaCy: {entities}")
-
-            # If entities are found, proceed
-            if entities:
-                entity = entities[0].strip()
-            else:
-                # Collect proper nouns and adjacent tokens to form potential entities
-                proper_nouns = []
-                temp_entity = ''
-                for token in doc:
-                    # Include tokens that are proper nouns, numbers, adjectives, or punctuation that might be part of the title
-                    if token.pos_ in ['PROPN', 'NOUN', 'NUM', 'ADJ'] or token.text in [':', '-', '"', "'"]:
-                        temp_entity += token.text_with_ws
-                    elif token.is_punct and token.text in [":", "-", ","]:
-                        temp_entity += token.text_with_ws
-                    else:
-                        if temp_entity.strip():
-                            proper_nouns.append(temp_entity.strip(' "\''))
-                            temp_entity = ''
-                if temp_entity.strip():
-                    proper_nouns.append(temp_entity.strip(' "\''))
-
-                # Unire i nomi propri in caso contengano parti divise dai due punti
-                proper_nouns_combined = " ".join(proper_nouns)
-                print(f"Proper nouns combined: {proper_nouns_combined}")
-
-                # Use the combined proper nouns as the entity if they exist
-                if proper_nouns_combined:
-                    entity = proper_nouns_combined
-                else:
-                    # Use the entire query for fuzzy matching as a last resort
-                    best_match = self.handle_fuzzy_matching(query)
-                    if best_match:
-                        entity = best_match
-                    else:
-                        return "Sorry, I couldn't find any entity in your question."
+            # Use the entire query for fuzzy matching as a last resort
+            entity = self.handle_fuzzy_matching(query)
+            if not entity:
+                return "Sorry, I couldn't find any entity in your question."
 
         entity = entity.strip()
         print(f"Final selected entity: {entity}")
         
         # Determine the type of request
+        intent = self.detect_intent(query)
+        films = self.resolve_entity(entity)
+        if not films:
+            # The cache key is case-insensitive, so only cache answers phrased with the graph's own label
+            return self.answer(entity, intent)
+        label = self.entity_labels.get(films[0], entity)
+        return self.answer_cache.get_or_compute(label, intent, lambda: self.answer(label, intent))
+
+    @staticmethod
+    def detect_intent(query):
+        """
+        Classify the question as 'director', 'screenwriter', 'release_date' or 'embedding'.
+        """
         query_lower = query.lower()
         if "director" in query_lower:
-            factual_answer = self.get_director(entity)
-            embedding_answer = self.handle_embedding_query(entity)
-            return f"{factual_answer}\n{embedding_answer}"
-
+            return 'director'
         elif any(keyword in query_lower for keyword in ["screenwriter", "writer", "author"]):
-            factual_answer = self.get_screenwriter(entity)
-            embedding_answer = self.handle_embedding_query(entity)
-            return f"{factual_answer}\n{embedding_answer}"
-
+            return 'screenwriter'
         elif any(keyword in query_lower for keyword in ["released", "release date", "published"]):
-            factual_answer = self.get_release_date(entity)
-            embedding_answer = self.handle_embedding_query(entity)
-            return f"{factual_answer}\n{embedding_answer}"
+            return 'release_date'
+        return 'embedding'
 
+    def answer(self, entity, intent):
+        """
+        Build the (uncached) answer for an entity and a detected intent.
+        """
+        if intent == 'director':
+            factual_answer = self.get_director(entity)
+        elif intent == 'screenwriter':
+            factual_answer = self.get_screenwriter(entity)
+        elif intent == 'release_date':
+            factual_answer = self.get_release_date(entity)
         else:
             # If it's a statement or an embedding question
-            embedding_answer = self.handle_embedding_query(entity)
-            return embedding_answer
+            return self.handle_embedding_query(entity)
+        embedding_answer = self.handle_embedding_query(entity)
+        return f"{factual_answer}\n{embedding_answer}"
 
 
 
@@ -250,128 +464,74 @@ class Agent:
 
     def get_director(self, entity_label):
         """
-        Fetch the director of the specified film entity using label filtering.
+        Fetch the director of the specified film entity with a direct graph lookup.
         """
-        # Escape special characters in entity_label
-        entity_label_escaped = entity_label.replace('"', '\\"')
-
-        sparql_query = f'''
-        PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
-        PREFIX ns1: <http://www.wikidata.org/prop/direct/>
-
-        SELECT ?directorLabel WHERE {{
-            ?film rdfs:label ?label .
-            FILTER (lcase(str(?label)) = lcase("{entity_label_escaped}") && lang(?label) = "en") .
-
-            ?film ns1:P57 ?director .
-            ?director rdfs:label ?directorLabel .
-            FILTER (lang(?directorLabel) = "en")
-        }}
-        '''
-        factual_answer = self.execute_sparql_query(sparql_query)
+        answers = self.lookup_label(entity_label, "P57")
 
-        if factual_answer == "No results found.":
+        if not answers:
             # Provide alternative information
             description = self.get_description(entity_label)
             return f"Factual Answer: Sorry, I couldn't find the director information for '{entity_label}'.\n{description}"
 
-        unique_answers = list(set(factual_answer.split(", ")))
-        return f"Factual Answer: The director of '{entity_label}' is {', '.join(unique_answers)}."
+        return f"Factual Answer: The director of '{entity_label}' is {', '.join(answers)}."
 
 
 
 
     def get_screenwriter(self, entity_label):
         """
-        Fetch the screenwriter of the specified film entity using label filtering.
+        Fetch the screenwriter of the specified film entity with a direct graph lookup.
         """
-        # Escape special characters in entity_label
-        entity_label_escaped = entity_label.replace('"', '\\"')
-
-        sparql_query = f'''
-        PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
-        PREFIX ns1: <http://www.wikidata.org/prop/direct/>
+        answers = self.lookup_label(entity_label, "P58")
 
-        SELECT ?screenwriterLabel WHERE {{
-            ?film rdfs:label ?label .
-            FILTER (lcase(str(?label)) = lcase("{entity_label_escaped}") && lang(?label) = "en") .
-
-            ?film ns1:P58 ?screenwriter .
-            ?screenwriter rdfs:label ?screenwriterLabel .
-            FILTER (lang(?screenwriterLabel) = "en")
-        }}
-        '''
-        factual_answer = self.execute_sparql_query(sparql_query)
-
-        if factual_answer == "No results found.":
+        if not answers:
             description = self.get_description(entity_label)
             return f"Factual Answer: Sorry, I couldn't find the screenwriter information for '{entity_label}'.\n{description}"
 
-        unique_answers = list(set(factual_answer.split(", ")))
-        return f"Factual Answer: The screenwriter of '{entity_label}' is {', '.join(unique_answers)}."
+        return f"Factual Answer: The screenwriter of '{entity_label}' is {', '.join(answers)}."
 
 
     def get_release_date(self, entity_label):
         """
-        Fetch the release date of the specified film entity using label filtering.
+        Fetch the release date of the specified film entity with a direct graph lookup.
         """
-        # Escape special characters in entity_label
-        entity_label_escaped = entity_label.replace('"', '\\"')
-
-        sparql_query = f'''
-        PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
-        PREFIX ns1: <http://www.wikidata.org/prop/direct/>
-
-        SELECT ?releaseDate WHERE {{
-            ?film rdfs:label ?label .
-            FILTER (lcase(str(?label)) = lcase("{entity_label_escaped}") && lang(?label) = "en") .
+        answers = self.lookup_label(entity_label, "P577")
 
-            ?film ns1:P577 ?releaseDate .
-        }}
-        '''
-        factual_answer = self.execute_sparql_query(sparql_query)
-
-        if factual_answer == "No results found.":
+        if not answers:
             description = self.get_description(entity_label)
             return f"Factual Answer: Sorry, I couldn't find the release date for '{entity_label}'.\n{description}"
 
-        unique_answers = list(set(factual_answer.split(", ")))
-        return f"Factual Answer: The release date of '{entity_label}' is {', '.join(unique_answers)}."
+        return f"Factual Answer: The release date of '{entity_label}' is {', '.join(answers)}."
 
 
     def get_description(self, entity_label):
         """
         Fetch the description of the specified film entity.
         """
-        # Escape special characters in entity_label
-        entity_label_escaped = entity_label.replace('"', '\\"')
-
-        sparql_query = f'''
-        PREFIX ns2: <http://schema.org/>
-        PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
-
-        SELECT ?description WHERE {{
-            ?film rdfs:label ?label .
-            FILTER (lcase(str(?label)) = lcase("{entity_label_escaped}") && lang(?label) = "en") .
-
-            ?film ns2:description ?description .
-            FILTER (lang(?description) = "en")
-        }}
-        '''
-        description = self.execute_sparql_query(sparql_query)
-        if description == "No results found.":
+        descriptions = []
+        for film in self.resolve_entity(entity_label):
+            description = self.execute_sparql_query('description', {'film': film})
+            if description != "No results found.":
+                descriptions.append(description)
+        if not descriptions:
             return "No description available."
         else:
-            return f"Description: {description}"
+            return f"Description: {', '.join(descriptions)}"
 
 
-    def execute_sparql_query(self, sparql_query):
+    def execute_sparql_query(self, sparql_query, init_bindings=None):
         """
         Execute the SPARQL query and return results from the knowledge graph.
+        sparql_query is either the name of a prepared template in SPARQL_TEMPLATES, bound with
+        init_bindings, or a raw query string (parsed on every call).
         """
         try:
-            logging.info(f"Executing SPARQL query: {sparql_query}")
-            result = self.graph.query(sparql_query)
+            if sparql_query in SPARQL_TEMPLATES:
+                logging.info(f"Executing SPARQL template '{sparql_query}' with {init_bindings}")
+                result = self.graph.query(SPARQL_TEMPLATES[sparql_query], initBindings=init_bindings)
+            else:
+                logging.info(f"Executing SPARQL query: {sparql_query}")
+                result = self.graph.query(sparql_query, initBindings=init_bindings)
             result_list = [str(row[0]) for row in result]
             return ", ".join(result_list) if result_list else "No results found."
         except Exception as e:
@@ -391,23 +551,27 @@ class Agent:
                 response += f"{idx}. {other_entity} (Similarity: {score:.2f})\n"
             return response
 
-    def handle_fuzzy_matching(self, text):
+    def build_fuzzy_labels(self):
+        """
+        All entity labels except generic words that should never be matched as an entity.
+        """
         # Define unwanted entities to exclude
         unwanted_entities = set([
             'director', 'screenwriter', 'writer', 'author',
             'released', 'release date', 'published', 'movie', 'film',
         ])
+        return [label for label in self.embedding_handler.lbl2ent.keys() if label.lower() not in unwanted_entities]
 
-        if not self.embedding_handler.lbl2ent:
+    def handle_fuzzy_matching(self, text):
+        if not self.fuzzy_labels:
             return None
-        all_labels = list(self.embedding_handler.lbl2ent.keys())
-        all_labels = [label for label in all_labels if label.lower() not in unwanted_entities]
 
         # Ignore text that's too short or empty
         if not text or len(text) < 3:
             return None
 
-        match = process.extractOne(text, all_labels, scorer=fuzz.WRatio)
+        # Score only the trigram shortlist instead of every label
+        match = self.fuzzy_index.extract_one(text, scorer=fuzz.WRatio)
         if match:
             best_match = match[0]
             score = match[1]
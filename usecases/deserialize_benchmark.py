@@ -0,0 +1,69 @@
+import json
+import statistics
+import sys
+import time
+from speakeasypy.openapi.client.api_client import ApiClient
+from speakeasypy.openapi.client.models import ChatRoomState
+from speakeasypy.src.records import ChatRoomStateRecord
+
+
+class RawResponse:
+    """ Minimal stand-in for the HTTP response both decoders read the body from. """
+
+    def __init__(self, data):
+        self.data = data
+
+    def release_conn(self):
+        pass
+
+
+def room_state_body(n_messages, n_reactions=None):
+    """ JSON body of a /api/room/{roomId}/{since} response with a long message history. """
+    n_reactions = n_messages // 10 if n_reactions is None else n_reactions
+    return json.dumps({
+        "info": {
+            "assignment": False, "formRef": "", "uid": "room", "remainingTime": 600000,
+            "userAliases": ["bot", "user"], "alias": "bot", "prompt": "", "markAsNoFeedback": False,
+            "startTime": 1700000000000,
+        },
+        "messages": [
+            {"timeStamp": 1700000000000 + i, "authorAlias": "user" if i % 2 else "bot", "ordinal": i,
+             "message": f"Who is the director of movie number {i}?"}
+            for i in range(n_messages)
+        ],
+        "reactions": [{"messageOrdinal": i, "type": "THUMBS_UP"} for i in range(n_reactions)],
+    }).encode("utf-8")
+
+
+def benchmark(n_messages, repeats=5):
+    """
+    Median milliseconds to decode one room state with the generated models (ApiClient.deserialize with type
+    checking, as the generated ChatApi does) and with the records fast path.
+    """
+    api_client = ApiClient()
+    body = room_state_body(n_messages)
+
+    generated_times, fast_times = [], []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        state = api_client.deserialize(RawResponse(body.decode("utf-8")), (ChatRoomState,), True)
+        generated_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        record = ChatRoomStateRecord.from_json(json.loads(RawResponse(body).data))
+        fast_times.append(time.perf_counter() - start)
+
+    assert [m.ordinal for m in state.messages] == [m.ordinal for m in record.messages]
+    return {
+        "generated_ms": 1000 * statistics.median(generated_times),
+        "fast_ms": 1000 * statistics.median(fast_times),
+    }
+
+
+if __name__ == '__main__':
+    # Usage: python usecases/deserialize_benchmark.py [message counts...] (from the repository root)
+    sizes = [int(arg) for arg in sys.argv[1:]] or [100, 1000, 10000]
+    for size in sizes:
+        report = benchmark(size)
+        print(f"messages={size:>6}  generated={report['generated_ms']:8.1f}ms  fast={report['fast_ms']:6.1f}ms  "
+              f"speedup={report['generated_ms'] / report['fast_ms']:.0f}x")
@@ -1,34 +1,56 @@
 import numpy as np
 import csv
 import rdflib
+from graph_snapshot import atomic_write, load_graph
 import spacy
 import re
 from rapidfuzz import process
 from sklearn.metrics.pairwise import cosine_similarity
 import logging
+import os
+from bisect import bisect_left, bisect_right
+from vector_search import top_k, top_k_rows
+from ann_index import IVFIndex
 
 class EmbeddingHandler:
-    def __init__(self):
+    def __init__(self, graph=None, use_ann=False, ann_nprobe=8):
         # Initialize logging
         logging.basicConfig(level=logging.INFO)
+        # Optional approximate nearest-neighbour index (exact search is used when None)
+        self.ann_index = None
         # Load entity and relation embeddings
         try:
-            self.entity_embeds = np.load("Datasets/ddis-graph-embeddings/entity_embeds.npy")
-            self.relation_embeds = np.load("Datasets/ddis-graph-embeddings/relation_embeds.npy")
+            # Memory-mapped: the raw rows are only read to build the sidecar and by get_entity_vector
+            self.entity_embeds = np.load("Datasets/ddis-graph-embeddings/entity_embeds.npy", mmap_mode="r")
+            self.relation_embeds = np.load("Datasets/ddis-graph-embeddings/relation_embeds.npy", mmap_mode="r")
+            # Unit-normalized copy of the entity embeddings, shared between processes through the page cache
+            self.entity_embeds_norm = self.load_normalized_embeddings(
+                "Datasets/ddis-graph-embeddings/entity_embeds.npy",
+                "Datasets/ddis-graph-embeddings/entity_embeds_norm.npy")
         except FileNotFoundError as e:
             logging.error(f"Error loading embeddings: {str(e)}")
             self.entity_embeds = None
             self.relation_embeds = None
+            self.entity_embeds_norm = None
             return
 
+        if use_ann:
+            self.ann_index = self.load_ann_index("Datasets/ddis-graph-embeddings/entity_embeds_ivf.npz", ann_nprobe)
+
         # Load entity and relation ID mappings
         self.entity_ids = self.load_mapping("Datasets/ddis-graph-embeddings/entity_ids.del")
         self.relation_ids = self.load_mapping("Datasets/ddis-graph-embeddings/relation_ids.del")
 
-        # Load entity labels
-        self.ent2lbl = self.load_entity_labels("Datasets/14_graph.ttl")
+        # Load entity labels (from the caller's graph when one is already loaded)
+        self.ent2lbl = self.load_entity_labels("Datasets/14_graph.ttl", graph=graph)
         self.lbl2ent = {lbl: ent for ent, lbl in self.ent2lbl.items()}
 
+        # Candidate structures for fuzzy matching, built once instead of per query
+        self.build_fuzzy_index()
+
+        # Map embedding rows back to entity URIs and labels
+        self.row2ent, self.row2lbl = self.build_row_index()
+
         # Initialize spaCy for entity extraction
         self.nlp = spacy.load("en_core_web_sm")
 
@@ -50,47 +72,134 @@ class EmbeddingHandler:
             logging.info(f"Skipped problematic lines during loading: {skipped_lines}")
         return mapping
 
-    def load_entity_labels(self, file_path):
-        graph = rdflib.Graph()
+    def load_normalized_embeddings(self, source_path, sidecar_path):
+        """
+        Load the row-normalized entity embeddings as a read-only memory map.
+        The sidecar file is (re)built whenever it is missing or older than the source embeddings;
+        if it cannot be written (e.g. a read-only dataset directory), the normalized copy stays in memory.
+        """
+        if not os.path.exists(sidecar_path) or os.path.getmtime(sidecar_path) < os.path.getmtime(source_path):
+            logging.info(f"Building normalized embeddings: {sidecar_path}")
+            norms = np.linalg.norm(self.entity_embeds, axis=1, keepdims=True)
+            norms[norms == 0] = 1  # Leave all-zero rows untouched instead of dividing by zero
+            normalized = (self.entity_embeds / norms).astype(self.entity_embeds.dtype, copy=False)
+            try:
+                atomic_write(sidecar_path, lambda f: np.save(f, normalized))
+            except OSError as e:
+                logging.error(f"Error writing normalized embeddings {sidecar_path}: {str(e)}")
+                return normalized
+        return np.load(sidecar_path, mmap_mode="r")
+
+    def load_ann_index(self, file_path, nprobe):
+        """
+        Load the IVF index over the normalized embeddings, building it when missing or stale.
+        """
+        if os.path.exists(file_path) and os.path.getmtime(file_path) >= os.path.getmtime(self.entity_embeds.filename):
+            return IVFIndex.load(file_path, nprobe=nprobe)
+        logging.info(f"Building IVF index: {file_path}")
+        index = IVFIndex.build(self.entity_embeds_norm, nprobe=nprobe)
         try:
-            graph.parse(file_path, format="turtle")
-        except Exception as e:
-            logging.error(f"Error loading Turtle file: {str(e)}")
-            return {}
+            index.save(file_path)
+        except OSError as e:
+            logging.error(f"Error writing IVF index {file_path}: {str(e)}")
+        return index
+
+    def load_entity_labels(self, file_path, graph=None):
+        """
+        Map entity URIs to their rdfs:label. The Turtle file is only parsed if no graph is passed in.
+        """
+        if graph is None:
+            try:
+                graph = load_graph(file_path)
+            except Exception as e:
+                logging.error(f"Error loading Turtle file: {str(e)}")
+                return {}
         ent2lbl = {str(ent): str(lbl) for ent, lbl in graph.subject_objects(rdflib.RDFS.label)}
         return ent2lbl
 
-    def get_entity_vector(self, entity_name):
+    def build_row_index(self):
         """
-        Get the embedding vector for a given entity name.
+        Build dense, row-indexed lists of entity URIs and labels (None for rows without an entity).
+        """
+        row2ent = [None] * len(self.entity_embeds)
+        for uri, index in self.entity_ids.items():
+            if 0 <= index < len(row2ent):
+                row2ent[index] = uri
+        row2lbl = [self.ent2lbl.get(uri, "") if uri is not None else None for uri in row2ent]
+        return row2ent, row2lbl
+
+    def build_fuzzy_index(self):
+        """
+        Precompute the label lists used by fuzzy matching:
+        - lbllower2ent: pre-lowercased labels for case-insensitive exact matches
+        - first_letter_buckets: first letter -> labels starting with it, sorted by length,
+          with their lengths in first_letter_lengths for bisecting a length window
+        """
+        self.all_labels = list(self.lbl2ent.keys())
+        self.lbllower2ent = {}
+        for label, uri in self.lbl2ent.items():
+            self.lbllower2ent.setdefault(label.lower(), uri)
+
+        buckets = {}
+        for label in self.all_labels:
+            buckets.setdefault(label.lower()[:1], []).append(label)
+        self.first_letter_buckets = {}
+        self.first_letter_lengths = {}
+        for letter, labels in buckets.items():
+            labels.sort(key=len)
+            self.first_letter_buckets[letter] = labels
+            self.first_letter_lengths[letter] = [len(label) for label in labels]
+
+    def get_candidate_labels(self, entity_name):
         """
-        # First, try exact matching
-        entity_uri = self.lbl2ent.get(entity_name)
+        Labels starting with the same letter as entity_name, sorted by length (all labels if there are none),
+        and the [start, end) slice of them whose length is within 1.5x of entity_name's length.
+        """
+        first_letter = entity_name.lower()[:1]
+        labels = self.first_letter_buckets.get(first_letter)
+        if not labels:
+            return self.all_labels, 0, len(self.all_labels)
+        lengths = self.first_letter_lengths[first_letter]
+        start = bisect_left(lengths, len(entity_name) / 1.5)
+        end = bisect_right(lengths, len(entity_name) * 1.5)
+        return labels, start, end
+
+    def get_entity_index(self, entity_name):
+        """
+        Get the embedding row index for a given entity name.
+        """
+        # First, try exact matching (case-sensitive, then case-insensitive)
+        entity_uri = self.lbl2ent.get(entity_name) or self.lbllower2ent.get(entity_name.lower())
         if entity_uri and entity_uri in self.entity_ids:
-            index = self.entity_ids[entity_uri]
-            return self.entity_embeds[index]
-        
-        # If exact match not found, limit the labels considered in fuzzy matching
-        # Limit to labels that start with the same first letter
-        first_letter = entity_name[0].lower()
-        candidate_labels = [label for label in self.lbl2ent.keys() if label.lower().startswith(first_letter)]
-        
-        # If no candidates found, consider all labels
-        if not candidate_labels:
-            candidate_labels = list(self.lbl2ent.keys())
-        
-        # Now perform fuzzy matching on the limited set
-        match = process.extractOne(entity_name, candidate_labels)
-        if match:
-            best_match = match[0]
-            score = match[1]
-            if score >= 80:
-                entity_uri = self.lbl2ent[best_match]
-                if entity_uri in self.entity_ids:
-                    index = self.entity_ids[entity_uri]
-                    return self.entity_embeds[index]
+            return self.entity_ids[entity_uri]
+
+        # If exact match not found, fuzzy match against the labels starting with the same first letter.
+        # WRatio scores labels of very different length with a scaled partial ratio (at most 90), so a
+        # match above 90 within the 1.5x length window is the best of the bucket and the rest can be skipped.
+        labels, start, end = self.get_candidate_labels(entity_name)
+        match = process.extractOne(entity_name, labels[start:end], score_cutoff=80)
+        best = (match[1], -(start + match[2]), match[0]) if match else None
+        if best is None or best[0] <= 90:
+            for offset, part in ((0, labels[:start]), (end, labels[end:])):
+                match = process.extractOne(entity_name, part, score_cutoff=80)
+                # Highest score wins; on ties the label first in the bucket, like extractOne over the bucket
+                if match and (best is None or (match[1], -(offset + match[2])) > best[:2]):
+                    best = (match[1], -(offset + match[2]), match[0])
+        if best:
+            entity_uri = self.lbl2ent[best[2]]
+            if entity_uri in self.entity_ids:
+                return self.entity_ids[entity_uri]
         return None
 
+    def get_entity_vector(self, entity_name):
+        """
+        Get the embedding vector for a given entity name.
+        """
+        index = self.get_entity_index(entity_name)
+        if index is None:
+            return None
+        return self.entity_embeds[index]
+
     def get_relation_vector(self, relation_name):
         if relation_name in self.relation_ids:
             index = self.relation_ids[relation_name]
@@ -112,30 +221,50 @@ class EmbeddingHandler:
     def get_top_similar_entities(self, label, top_n=5):
         """
         Get the top N most similar entities to the given label.
+        Results are ordered by cosine similarity; ties are broken by the lower embedding row.
         """
-        vector = self.get_entity_vector(label)
-        if vector is None:
+        index = self.get_entity_index(label)
+        if index is None:
             return None
 
-        # Compute cosine similarities efficiently
-        # Normalize the vectors
-        norm_vectors = self.entity_embeds / np.linalg.norm(self.entity_embeds, axis=1, keepdims=True)
-        vector_norm = vector / np.linalg.norm(vector)
+        if self.ann_index is not None:
+            top_indices, top_scores = self.ann_index.search(
+                self.entity_embeds_norm, self.entity_embeds_norm[index], top_n, exclude=index)
+            return self.label_results(top_indices, top_scores)
 
-        # Compute cosine similarities
-        similarities = norm_vectors @ vector_norm
+        # Rows are unit-normalized, so the dot product is the cosine similarity
+        similarities = self.entity_embeds_norm @ self.entity_embeds_norm[index]
 
         # Get top N indices excluding the entity itself
-        top_indices = similarities.argsort()[-(top_n + 1):][::-1]
+        top_indices, top_scores = top_k(similarities, top_n, exclude=index)
+        return self.label_results(top_indices, top_scores)
+
+    def get_top_similar_entities_batch(self, labels, top_n=5, chunk_size=256):
+        """
+        Get the top N most similar entities for several labels at once.
+        The query rows are stacked and scored with one matrix product per chunk (Q @ E.T).
+        This path is always exact, even when an ANN index is loaded.
+        Returns a list aligned with `labels`, holding None for labels that could not be resolved.
+        """
+        results = [None] * len(labels)
+        resolved = [(pos, index) for pos, index in enumerate(map(self.get_entity_index, labels)) if index is not None]
+
+        # Chunk the queries to bound the size of the score matrix (chunk_size x number of entities)
+        for start in range(0, len(resolved), chunk_size):
+            chunk = resolved[start:start + chunk_size]
+            rows = np.array([index for _, index in chunk])
+            similarities = self.entity_embeds_norm[rows] @ self.entity_embeds_norm.T
+            for (pos, _), (top_indices, top_scores) in zip(chunk, top_k_rows(similarities, top_n, excludes=rows)):
+                results[pos] = self.label_results(top_indices, top_scores)
+        return results
+
+    def label_results(self, top_indices, top_scores):
+        """
+        Turn ranked embedding rows into (label, similarity) pairs, skipping rows without an entity.
+        """
         results = []
-        for idx in top_indices:
-            if np.array_equal(self.entity_embeds[idx], vector):
-                continue  # Skip the entity itself
-            entity_uri = next((uri for uri, index in self.entity_ids.items() if index == idx), None)
-            if entity_uri:
-                entity_label = self.ent2lbl.get(entity_uri, "")
-                similarity_score = similarities[idx]
+        for idx, similarity_score in zip(top_indices, top_scores):
+            entity_label = self.row2lbl[idx]
+            if entity_label is not None:
                 results.append((entity_label, similarity_score))
-            if len(results) == top_n:
-                break
-        return results
\ No newline at end of file
+        return results
@@ -0,0 +1,65 @@
+import statistics
+import sys
+import time
+from rapidfuzz import process, fuzz
+from rdflib import RDFS
+from fuzzy_index import TrigramIndex
+from graph_snapshot import load_graph
+from nlp_benchmark import QUESTIONS
+
+
+def misspell(text):
+    """ Swap two characters in the middle of the text, a typical typo. """
+    i = len(text) // 2
+    return text[:i - 1] + text[i] + text[i - 1] + text[i + 1:] if len(text) > 3 else text
+
+
+def benchmark(labels, queries, limit=300):
+    """
+    Compare the trigram shortlist against an exhaustive process.extractOne scan with fuzz.WRatio.
+    Agreement counts queries where both return the same label; score agreement counts queries where
+    the shortlist found a label with the same best score (another label may win a tie).
+    """
+    start = time.perf_counter()
+    index = TrigramIndex(labels)
+    build_time = time.perf_counter() - start
+
+    exhaustive_times, index_times = [], []
+    same_label, same_score = 0, 0
+    for query in queries:
+        start = time.perf_counter()
+        exhaustive = process.extractOne(query, labels, scorer=fuzz.WRatio)
+        exhaustive_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        shortlisted = index.extract_one(query, scorer=fuzz.WRatio, limit=limit)
+        index_times.append(time.perf_counter() - start)
+
+        if exhaustive and shortlisted:
+            same_label += exhaustive[0] == shortlisted[0]
+            same_score += abs(exhaustive[1] - shortlisted[1]) < 1e-3  # cdist returns float32 scores
+    return {
+        "build_s": build_time,
+        "exhaustive_ms": 1000 * statistics.median(exhaustive_times),
+        "index_ms": 1000 * statistics.median(index_times),
+        "label_agreement": same_label / len(queries),
+        "score_agreement": same_score / len(queries),
+    }
+
+
+if __name__ == '__main__':
+    # Usage: python fuzzy_benchmark.py [shortlist size] (from the repository root)
+    shortlist_size = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    graph = load_graph("Datasets/14_graph.ttl")
+    all_labels = list({str(label) for label in graph.objects(None, RDFS.label)})
+
+    # Whole questions (as passed to Agent.handle_fuzzy_matching), bare titles and misspelled titles
+    benchmark_queries = [question for question, _ in QUESTIONS]
+    benchmark_queries += [title for _, title in QUESTIONS]
+    benchmark_queries += [misspell(title) for _, title in QUESTIONS]
+
+    report = benchmark(all_labels, benchmark_queries, limit=shortlist_size)
+    print(f"labels={len(all_labels)}  queries={len(benchmark_queries)}  shortlist={shortlist_size}  "
+          f"build={report['build_s']:.1f}s")
+    print(f"exhaustive median={report['exhaustive_ms']:.1f}ms  trigram median={report['index_ms']:.1f}ms")
+    print(f"label agreement={report['label_agreement']:.0%}  score agreement={report['score_agreement']:.0%}")
@@ -0,0 +1,59 @@
+import numpy as np
+from rapidfuzz import process, fuzz
+from vector_search import top_k
+
+
+def trigrams(text):
+    """ Set of character trigrams of the lowercased, space-padded text. """
+    padded = f" {text.lower()} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    """
+    Character-trigram inverted index over labels.
+
+    shortlist() ranks labels by trigram overlap with the query so that only a few hundred
+    candidates have to be scored with the (much more expensive) rapidfuzz scorer.
+    """
+
+    def __init__(self, labels):
+        self.labels = list(labels)
+        postings = {}
+        self.trigram_counts = np.empty(len(self.labels), dtype=np.int32)
+        for i, label in enumerate(self.labels):
+            grams = trigrams(label)
+            self.trigram_counts[i] = len(grams)
+            for gram in grams:
+                postings.setdefault(gram, []).append(i)
+        self.postings = {gram: np.array(ids, dtype=np.int32) for gram, ids in postings.items()}
+
+    def shortlist(self, query, limit=300):
+        """
+        Positions of the `limit` labels with the highest trigram overlap coefficient with the query,
+        i.e. shared trigrams divided by the trigram count of the shorter string. This favours labels
+        contained in the query (and the other way round), which is what WRatio's partial matching rewards.
+        """
+        query_grams = [gram for gram in trigrams(query) if gram in self.postings]
+        if not query_grams:
+            return np.empty(0, dtype=np.int64)
+        hits = np.bincount(np.concatenate([self.postings[gram] for gram in query_grams]), minlength=len(self.labels))
+        matched = np.flatnonzero(hits)
+        overlap = hits[matched] / np.minimum(self.trigram_counts[matched], len(trigrams(query)))
+        candidates, _ = top_k(overlap, limit, ids=matched)
+        return candidates
+
+    def extract_one(self, query, scorer=fuzz.WRatio, limit=300, score_cutoff=None, workers=-1):
+        """
+        Best match among the shortlisted labels, as (label, score, position) like process.extractOne,
+        or None. Candidates are scored in parallel with process.cdist.
+        """
+        candidates = self.shortlist(query, limit)
+        if len(candidates) == 0:
+            return None
+        choices = [self.labels[i] for i in candidates]
+        scores = process.cdist([query], choices, scorer=scorer, workers=workers)[0]
+        best = int(np.argmax(scores))
+        if score_cutoff is not None and scores[best] < score_cutoff:
+            return None
+        return choices[best], float(scores[best]), int(candidates[best])
@@ -0,0 +1,141 @@
+import logging
+import os
+import pickle
+import re
+from collections import deque
+from graph_snapshot import atomic_write
+from question_words import UNWANTED_ENTITIES
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+# Bump whenever STOPWORDS, tokenize or the saved layout change so old automata are rebuilt
+MATCHER_VERSION = 1
+
+# Titles made only of these words are too ambiguous to be matched inside a sentence
+STOPWORDS = UNWANTED_ENTITIES | {
+    'a', 'an', 'the', 'of', 'in', 'on', 'at', 'to', 'for', 'by', 'with', 'and', 'or', 'from', 'about',
+    'is', 'was', 'are', 'were', 'be', 'it', 'its', 'i', 'me', 'my', 'you', 'he', 'she', 'they', 'we',
+    'this', 'that', 'which', 'whom', 'tell', 'give', 'recommend', 'similar', 'like', 'movies', 'films',
+    'date', 'release', 'screenplay', 'name',
+}
+
+
+def tokenize(text):
+    """ Lowercased word tokens; punctuation is ignored so "Star Wars: Episode IV" matches "star wars episode iv". """
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class TitleMatcher:
+    """
+    Token-level Aho-Corasick automaton over known titles.
+
+    find_longest scans a message once (linear in its number of tokens) and returns the longest
+    known title it contains.
+    """
+
+    def __init__(self):
+        self.goto = [{}]  # node -> {token: child node}
+        self.fail = [0]  # node -> longest proper suffix that is also a trie node
+        self.output = [None]  # node -> (number of tokens, label) of the longest title ending at this node
+
+    @classmethod
+    def build(cls, labels):
+        matcher = cls()
+        for label in labels:
+            matcher.add(label)
+        matcher.link()
+        return matcher
+
+    def add(self, label):
+        tokens = tokenize(label)
+        if not tokens or all(token in STOPWORDS for token in tokens):
+            return
+        node = 0
+        for token in tokens:
+            child = self.goto[node].get(token)
+            if child is None:
+                child = self.goto[node][token] = len(self.goto)
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append(None)
+            node = child
+        if self.output[node] is None:  # keep the first label for titles that only differ in case/punctuation
+            self.output[node] = (len(tokens), label)
+
+    def link(self):
+        """
+        Compute failure links breadth-first, after all titles were added.
+        """
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for token, child in self.goto[node].items():
+                fail = self.fail[node]
+                while fail and token not in self.goto[fail]:
+                    fail = self.fail[fail]
+                self.fail[child] = self.goto[fail].get(token, 0) if node else 0
+                # A title ending at this node is always longer than one ending at its suffix
+                if self.output[child] is None:
+                    self.output[child] = self.output[self.fail[child]]
+                queue.append(child)
+
+    def find_longest(self, text):
+        """
+        Return the longest known title in text (the first one on ties), or None.
+        """
+        best = None
+        node = 0
+        for token in tokenize(text):
+            while node and token not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(token, 0)
+            match = self.output[node]
+            if match is not None and (best is None or match[0] > best[0]):
+                best = match
+        return best[1] if best else None
+
+    def save(self, file_path, fingerprint=None):
+        state = {
+            "version": MATCHER_VERSION,
+            "fingerprint": fingerprint,
+            "goto": self.goto,
+            "fail": self.fail,
+            "output": self.output,
+        }
+        atomic_write(file_path, lambda f: pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL))
+
+    @classmethod
+    def load(cls, file_path, fingerprint=None):
+        """
+        Load a saved automaton, or return None if it is missing, unreadable or built from other data.
+        """
+        if not os.path.exists(file_path):
+            return None
+        try:
+            with open(file_path, "rb") as f:
+                state = pickle.load(f)
+        except Exception as e:
+            logging.error(f"Error reading title matcher {file_path}: {str(e)}")
+            return None
+        if (not isinstance(state, dict) or state.get("version") != MATCHER_VERSION
+                or state.get("fingerprint") != fingerprint):
+            logging.info(f"Title matcher {file_path} is out of date.")
+            return None
+        matcher = cls()
+        matcher.goto, matcher.fail, matcher.output = state["goto"], state["fail"], state["output"]
+        return matcher
+
+    @classmethod
+    def load_or_build(cls, file_path, fingerprint, labels):
+        """
+        Load the automaton saved for this fingerprint, or build it from labels and save it.
+        """
+        matcher = cls.load(file_path, fingerprint)
+        if matcher is None:
+            logging.info(f"Building title matcher: {file_path}")
+            matcher = cls.build(labels)
+            try:
+                matcher.save(file_path, fingerprint)
+            except OSError as e:
+                logging.error(f"Error writing title matcher {file_path}: {str(e)}")
+        return matcher
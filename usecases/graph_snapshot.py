@@ -0,0 +1,201 @@
+import logging
+import os
+import pickle
+import time
+import numpy as np
+import rdflib
+from rdflib.plugins.stores.memory import SimpleMemory
+
+# Bump whenever the on-disk layout changes so old snapshots are rebuilt
+SNAPSHOT_VERSION = 2
+
+# Column order of each sorted copy of the triples (0 = subject, 1 = predicate, 2 = object)
+INDEX_ORDERS = {"spo": (0, 1, 2), "pos": (1, 2, 0), "osp": (2, 0, 1)}
+
+
+def source_fingerprint(file_path):
+    """
+    Identify the current version of a file by its size and modification time.
+    """
+    stat = os.stat(file_path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def atomic_write(file_path, write_fn):
+    """
+    Write a file through write_fn(f) into a temporary file that replaces file_path once complete,
+    so other processes never read a partial file. The temporary file is removed if writing fails.
+    """
+    tmp_path = f"{file_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            write_fn(f)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def load_graph(file_path, snapshot_path=None):
+    """
+    Load a Turtle file into an rdflib Graph, going through a binary snapshot when possible.
+    The snapshot is written after the first parse and reused until the Turtle file's size or mtime changes.
+    A graph loaded from the snapshot is read-only (see SnapshotStore).
+    """
+    snapshot_path = snapshot_path or f"{file_path}.snapshot"
+    fingerprint = source_fingerprint(file_path)
+
+    start = time.time()
+    graph = read_snapshot(snapshot_path, fingerprint)
+    if graph is not None:
+        logging.info(f"Loaded graph snapshot {snapshot_path} ({len(graph)} triples) in {time.time() - start:.1f}s")
+        return graph
+
+    graph = rdflib.Graph()
+    graph.parse(file_path, format="turtle")
+    logging.info(f"Parsed {file_path} ({len(graph)} triples) in {time.time() - start:.1f}s")
+    try:
+        write_snapshot(graph, snapshot_path, fingerprint)
+    except OSError as e:
+        logging.error(f"Error writing graph snapshot {snapshot_path}: {str(e)}")
+    return graph
+
+
+def write_snapshot(graph, snapshot_path, fingerprint):
+    """
+    Store the graph as integer-encoded triples, sorted once per lookup order, plus a dictionary of distinct terms.
+    """
+    term_ids = {}
+    terms = []
+    triples = np.empty((len(graph), 3), dtype=np.int32)
+    for i, triple in enumerate(graph):
+        for j, term in enumerate(triple):
+            term_id = term_ids.get(term)
+            if term_id is None:
+                term_id = term_ids[term] = len(terms)
+                terms.append(_encode_term(term))
+            triples[i, j] = term_id
+
+    indexes = {}
+    for name, order in INDEX_ORDERS.items():
+        columns = triples[:, order]
+        # One contiguous row per column, sorted by the first column, then the second, then the third
+        indexes[name] = np.ascontiguousarray(columns[np.lexsort(columns.T[::-1])].T)
+
+    snapshot = {
+        "version": SNAPSHOT_VERSION,
+        "fingerprint": fingerprint,
+        "terms": terms,
+        "indexes": indexes,
+        "namespaces": [(prefix, str(namespace)) for prefix, namespace in graph.namespaces()],
+    }
+    atomic_write(snapshot_path, lambda f: pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def read_snapshot(snapshot_path, fingerprint):
+    """
+    Open a snapshot as a Graph, or return None if it is missing, unreadable or stale.
+    """
+    if not os.path.exists(snapshot_path):
+        return None
+    try:
+        with open(snapshot_path, "rb") as f:
+            snapshot = pickle.load(f)
+    except Exception as e:
+        logging.error(f"Error reading graph snapshot {snapshot_path}: {str(e)}")
+        return None
+    if snapshot.get("version") != SNAPSHOT_VERSION or tuple(snapshot.get("fingerprint", ())) != tuple(fingerprint):
+        logging.info(f"Graph snapshot {snapshot_path} is out of date.")
+        return None
+
+    graph = rdflib.Graph(store=SnapshotStore(snapshot["terms"], snapshot["indexes"]))
+    for prefix, namespace in snapshot["namespaces"]:
+        graph.namespace_manager.bind(prefix, namespace, override=True, replace=True)
+    return graph
+
+
+class SnapshotStore(SimpleMemory):
+    """
+    Read-only rdflib store answering lookups straight from a snapshot's integer-encoded triples.
+
+    Loading only unpickles the arrays instead of inserting every triple into a Memory store: a triple
+    pattern is answered by binary search over the copy of the triples sorted by its bound terms, and
+    terms are decoded into rdflib terms the first time a lookup returns them.
+    """
+
+    def __init__(self, terms, indexes):
+        super().__init__()
+        self._terms = terms
+        self._decoded = [None] * len(terms)
+        self._term_ids = {term: term_id for term_id, term in enumerate(terms)}
+        self._indexes = indexes
+
+    def add(self, triple, context, quoted=False):
+        raise TypeError("Graphs loaded from a snapshot are read-only.")
+
+    def remove(self, triple, context=None):
+        raise TypeError("Graphs loaded from a snapshot are read-only.")
+
+    def __len__(self, context=None):
+        return self._indexes["spo"].shape[1]
+
+    def triples(self, triple_pattern, context=None):
+        ids = []
+        for term in triple_pattern:
+            if term is None:
+                ids.append(None)
+                continue
+            term_id = self._term_ids.get(_encode_term(term))
+            if term_id is None:
+                return  # a term the graph does not contain matches nothing
+            ids.append(term_id)
+
+        s, p, o = ids
+        if s is not None:
+            name = "osp" if p is None and o is not None else "spo"
+        elif p is not None:
+            name = "pos"
+        else:
+            name = "osp"
+        order = INDEX_ORDERS[name]
+        index = self._indexes[name]
+
+        # The bound terms always lead the chosen order, so narrowing the range column by column finds every match
+        start, stop = 0, index.shape[1]
+        for row, column in enumerate(order):
+            if ids[column] is None:
+                break
+            values = index[row, start:stop]
+            start, stop = (start + int(np.searchsorted(values, ids[column], side="left")),
+                           start + int(np.searchsorted(values, ids[column], side="right")))
+
+        for row in index[:, start:stop].T.tolist():
+            triple = [None, None, None]
+            for column, term_id in zip(order, row):
+                triple[column] = self._term(term_id)
+            yield tuple(triple), iter(())
+
+    def _term(self, term_id):
+        term = self._decoded[term_id]
+        if term is None:
+            term = self._decoded[term_id] = _decode_term(*self._terms[term_id])
+        return term
+
+
+def _encode_term(term):
+    if isinstance(term, rdflib.Literal):
+        # Language tags compare case-insensitively in rdflib, so they are stored lowercased
+        language = term.language.lower() if term.language else None
+        return "L", str(term), language, str(term.datatype) if term.datatype else None
+    if isinstance(term, rdflib.BNode):
+        return "B", str(term), None, None
+    return "U", str(term), None, None
+
+
+def _decode_term(kind, value, language, datatype):
+    if kind == "L":
+        return rdflib.Literal(value, lang=language, datatype=rdflib.URIRef(datatype) if datatype else None)
+    if kind == "B":
+        return rdflib.BNode(value)
+    return rdflib.URIRef(value)
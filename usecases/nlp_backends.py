@@ -0,0 +1,82 @@
+import re
+import spacy
+from question_words import UNWANTED_ENTITIES
+
+NLP_BACKENDS = ("trf", "sm", "ruler")
+
+
+def load_pipeline(backend="trf", title_labels=None):
+    """
+    Load the spaCy pipeline used for entity extraction.
+
+    backend:
+        "trf"   - en_core_web_trf, the full transformer pipeline (slowest, over a gigabyte of RAM).
+        "sm"    - en_core_web_sm without the parser and lemmatizer; only doc.ents and POS tags are read.
+        "ruler" - "sm" plus an EntityRuler tagging the given title_labels (e.g. the graph's movie labels)
+                  as WORK_OF_ART, matched case-insensitively.
+    """
+    if backend == "trf":
+        return spacy.load("en_core_web_trf")
+    if backend not in NLP_BACKENDS:
+        raise ValueError(f"Unknown NLP backend '{backend}', expected one of {NLP_BACKENDS}")
+
+    nlp = spacy.load("en_core_web_sm", disable=["parser", "lemmatizer"])
+    if backend == "ruler":
+        ruler = nlp.add_pipe("entity_ruler", before="ner", config={"phrase_matcher_attr": "LOWER"})
+        ruler.add_patterns([{"label": "WORK_OF_ART", "pattern": label} for label in title_labels or []])
+    return nlp
+
+
+def extract_entity(nlp, query, title_matcher=None):
+    """
+    Extract the entity a question is about: a quoted title, else the longest known title found by
+    title_matcher (a gazetteer.TitleMatcher), else a spaCy entity, else the concatenated proper nouns.
+    Returns None if nothing is found.
+    """
+    # Prima cerca di estrarre il titolo tra virgolette
+    match = re.search(r'"([^"]+)"', query)
+    if match:
+        entity = match.group(1)
+        print(f"Entity extracted from quotes: {entity}")
+        return entity.strip()
+
+    if title_matcher is not None:
+        entity = title_matcher.find_longest(query)
+        if entity:
+            print(f"Entity extracted from known titles: {entity}")
+            return entity
+
+    # Analyze the question using NLP (only needed without a quoted title)
+    doc = nlp(query)
+
+    # Se non trova entità tra virgolette, usa spaCy
+    entities = [ent.text for ent in doc.ents if ent.label_ in ["WORK_OF_ART", "ORG", "EVENT"]]
+    entities = [ent for ent in entities if ent.lower() not in UNWANTED_ENTITIES]
+    print(f"Extracted entities after spaCy: {entities}")
+
+    # If entities are found, proceed
+    if entities:
+        return entities[0].strip()
+
+    # Collect proper nouns and adjacent tokens to form potential entities
+    proper_nouns = []
+    temp_entity = ''
+    for token in doc:
+        # Include tokens that are proper nouns, numbers, adjectives, or punctuation that might be part of the title
+        if token.pos_ in ['PROPN', 'NOUN', 'NUM', 'ADJ'] or token.text in [':', '-', '"', "'"]:
+            temp_entity += token.text_with_ws
+        elif token.is_punct and token.text in [":", "-", ","]:
+            temp_entity += token.text_with_ws
+        else:
+            if temp_entity.strip():
+                proper_nouns.append(temp_entity.strip(' "\''))
+                temp_entity = ''
+    if temp_entity.strip():
+        proper_nouns.append(temp_entity.strip(' "\''))
+
+    # Unire i nomi propri in caso contengano parti divise dai due punti
+    proper_nouns_combined = " ".join(proper_nouns)
+    print(f"Proper nouns combined: {proper_nouns_combined}")
+
+    # Use the combined proper nouns as the entity if they exist
+    return proper_nouns_combined.strip() or None
@@ -0,0 +1,74 @@
+import contextlib
+import io
+import statistics
+import sys
+import time
+from nlp_backends import NLP_BACKENDS, load_pipeline, extract_entity
+
+# Fixed question set with the entity the bot is expected to extract
+QUESTIONS = [
+    ("Who is the director of Good Will Hunting?", "Good Will Hunting"),
+    ("Who directed The Bridge on the River Kwai?", "The Bridge on the River Kwai"),
+    ("Who is the director of Star Wars: Episode VI - Return of the Jedi?", "Star Wars: Episode VI - Return of the Jedi"),
+    ("Who is the screenwriter of The Masked Gang: Cyprus?", "The Masked Gang: Cyprus"),
+    ("When was \"The Godfather\" released?", "The Godfather"),
+    ("When was The Godfather released?", "The Godfather"),
+    ("Who wrote the screenplay of The Shawshank Redemption?", "The Shawshank Redemption"),
+    ("What is the release date of Inception?", "Inception"),
+    ("Who is the director of Apocalypse Now?", "Apocalypse Now"),
+    ("Who is the author of Fight Club?", "Fight Club"),
+    ("When was Jurassic Park released?", "Jurassic Park"),
+    ("Who directed Pulp Fiction?", "Pulp Fiction"),
+    ("Who is the screenwriter of Titanic?", "Titanic"),
+    ("Recommend movies similar to The Lion King.", "The Lion King"),
+    ("Tell me about \"Blade Runner\"", "Blade Runner"),
+]
+
+
+def benchmark(backend, title_labels=None, repeats=3):
+    """
+    Measure load time, per-message latency and extraction accuracy of a backend on QUESTIONS.
+    """
+    start = time.perf_counter()
+    nlp = load_pipeline(backend, title_labels)
+    load_time = time.perf_counter() - start
+
+    # Warm up so lazy initialization is not counted as latency
+    nlp(QUESTIONS[0][0])
+
+    latencies = []
+    correct = 0
+    # extract_entity prints its intermediate steps; keep them out of the report
+    with contextlib.redirect_stdout(io.StringIO()):
+        for question, expected in QUESTIONS:
+            for _ in range(repeats):
+                start = time.perf_counter()
+                entity = extract_entity(nlp, question)
+                latencies.append(time.perf_counter() - start)
+            correct += entity is not None and entity.lower() == expected.lower()
+
+    latencies.sort()
+    return {
+        "backend": backend,
+        "load_s": load_time,
+        "median_ms": 1000 * statistics.median(latencies),
+        "p95_ms": 1000 * latencies[int(0.95 * (len(latencies) - 1))],
+        "accuracy": correct / len(QUESTIONS),
+    }
+
+
+if __name__ == '__main__':
+    # Usage: python nlp_benchmark.py [backend ...] (from the repository root for the "ruler" backend)
+    backends = sys.argv[1:] or list(NLP_BACKENDS)
+    title_labels = None
+    if "ruler" in backends:
+        from demo_bot import movie_labels
+        from graph_snapshot import load_graph
+
+        # The same movie labels the bot feeds to the EntityRuler
+        title_labels = movie_labels(load_graph("Datasets/14_graph.ttl"))
+
+    reports = [benchmark(backend, title_labels) for backend in backends]
+    for report in reports:
+        print(f"{report['backend']:6s}  load={report['load_s']:.1f}s  median={report['median_ms']:.1f}ms  "
+              f"p95={report['p95_ms']:.1f}ms  accuracy={report['accuracy']:.0%}")
@@ -0,0 +1,7 @@
+# Words of the questions themselves, never the entity a question is about.
+# Kept free of imports so both the spaCy backends and the pure-Python gazetteer can use it.
+UNWANTED_ENTITIES = set([
+    'who', 'what', 'when', 'where', 'why', 'how',
+    'director', 'screenwriter', 'writer', 'author',
+    'released', 'release date', 'published', 'movie', 'film', 'wrote', 'directed',
+])
@@ -0,0 +1,64 @@
+import numpy as np
+
+
+def top_k(scores, k, ids=None, exclude=None):
+    """
+    Return the ids and scores of the k highest scores, best first.
+
+    Uses np.argpartition so only the candidates are sorted instead of all scores.
+    Ties are broken by the smaller id, so the result is deterministic.
+    `ids` maps positions in `scores` to ids (defaults to the positions themselves),
+    `exclude` is an id that is dropped from the ranking (e.g. the query entity).
+    """
+    scores = np.asarray(scores)
+    ids = np.arange(len(scores)) if ids is None else np.asarray(ids)
+    if k <= 0 or len(scores) == 0:
+        return ids[:0], scores[:0]
+
+    # Take one extra candidate so the excluded id can be dropped afterwards
+    m = min(k + (exclude is not None), len(scores))
+    if m < len(scores):
+        part = np.argpartition(-scores, m - 1)[:m]
+        # argpartition picks arbitrarily among scores tied with the threshold, so keep all of them
+        candidates = np.flatnonzero(scores >= scores[part].min())
+    else:
+        candidates = np.arange(len(scores))
+    return _rank(scores, ids, candidates, k, exclude)
+
+
+def _rank(scores, ids, candidates, k, exclude):
+    """ Sort candidate positions by score (desc) then id (asc), drop `exclude` and cut to k. """
+    candidate_ids = ids[candidates]
+    order = np.lexsort((candidate_ids, -scores[candidates]))
+    candidates, candidate_ids = candidates[order], candidate_ids[order]
+    if exclude is not None:
+        keep = candidate_ids != exclude
+        candidates, candidate_ids = candidates[keep], candidate_ids[keep]
+    return candidate_ids[:k], scores[candidates[:k]]
+
+
+def top_k_rows(scores, k, excludes=None):
+    """
+    Row-wise top_k over a (queries x entities) score matrix.
+
+    Returns one (ids, scores) pair per row, with the same ordering and tie-breaking as top_k.
+    `excludes` gives the id to drop for each row (or None).
+    """
+    scores = np.asarray(scores)
+    n_rows, n_cols = scores.shape
+    ids = np.arange(n_cols)
+    if excludes is None:
+        excludes = [None] * n_rows
+    if k <= 0 or n_cols == 0:
+        return [(ids[:0], row[:0]) for row in scores]
+
+    m = min(k + 1, n_cols)
+    if m < n_cols:
+        # One partition call for the whole matrix; ties at each row's threshold are recovered below
+        part = np.argpartition(-scores, m - 1, axis=1)[:, :m]
+        thresholds = np.take_along_axis(scores, part, axis=1).min(axis=1)
+    results = []
+    for i, row in enumerate(scores):
+        candidates = np.flatnonzero(row >= thresholds[i]) if m < n_cols else ids
+        results.append(_rank(row, ids, candidates, k, excludes[i]))
+    return results